@@ -21,6 +21,8 @@ class Neo4jConfig:
     username: str
     password: str
     mode: str = None
+    database: str = None  # None uses the server's default database
+    fetch_size: int = 10000  # Records pulled per Bolt round-trip (driver default: 1000)
 
 
 @dataclass
@@ -56,8 +58,9 @@ def get_config(env):
     Build configuration for a given environment.
 
     You can override any of these via environment variables, e.g.:
-    NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, NEO4J_MODE,
-    PG_HOST, PG_PORT, PG_DB, PG_USERNAME, PG_PASSWORD.
+    NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, NEO4J_MODE, NEO4J_DATABASE, NEO4J_FETCH_SIZE,
+    PG_HOST, PG_PORT, PG_DB, PG_USERNAME, PG_PASSWORD, PG_BATCH_SIZE
+    (rows per multi-row INSERT, see db/postgres_utils.py).
     For the nectar_new database override NECTAR_PG_HOST, NECTAR_PG_PORT,
     NECTAR_PG_DB, NECTAR_PG_USERNAME, NECTAR_PG_PASSWORD.
     """
@@ -157,6 +160,11 @@ def get_config(env):
         client_domain = "ecd"
         community_domain = "ecd"
     
+    # Optional in every environment; naming the database saves the driver a routing lookup
+    neo4j.database = os.getenv("NEO4J_DATABASE") or None
+    # The exports stream large results; bigger pulls mean fewer round-trips, same memory per batch
+    neo4j.fetch_size = int(_env_or_default("NEO4J_FETCH_SIZE", str(neo4j.fetch_size)))
+    
     return AppConfig(
         env=env,
         neo4j=neo4j,
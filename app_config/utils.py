@@ -1,3 +1,6 @@
+import logging
+import os
+import uuid
 from datetime import datetime, timezone
 
 def convert_epoch_to_timestamp(value):
@@ -21,3 +24,33 @@ def convert_epoch_to_timestamp(value):
         dt = datetime.fromtimestamp(value, tz=timezone.utc)
 
     return dt
+
+
+def clean_csv_value(value):
+    """
+    Strip whitespace, then surrounding double and single quotes, then whitespace
+    again from a CSV value; empty values become None.
+    Same result as value.strip().strip('"').strip("'").strip(), but values without
+    quotes at either end (the common case) need only the one strip call.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value and (value[0] in "\"'" or value[-1] in "\"'"):
+        value = value.strip('"').strip("'").strip()
+    return value or None
+
+
+def flush_log_handlers():
+    """Flush buffered log handlers so pending output shows before an interactive prompt."""
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+
+
+def bulk_uuids(n):
+    """
+    Generate n random (version 4) UUIDs as hyphenated strings, the same format as str(uuid.uuid4()).
+    Draws all the random bytes with a single os.urandom call instead of one per id.
+    """
+    raw = os.urandom(16 * n)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * n, 16)]
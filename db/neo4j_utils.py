@@ -2,7 +2,7 @@ import logging
 from contextlib import contextmanager
 from typing import Any, Callable, Dict, Iterable, List, Optional
 
-from neo4j import GraphDatabase, Driver, Session
+from neo4j import GraphDatabase, Driver, Record, Session
 
 from app_config.settings import Neo4jConfig
 
@@ -24,14 +24,35 @@ def create_neo4j_driver(cfg):
 
 
 @contextmanager
-def neo4j_session(driver: Driver) -> Iterable[Session]:
-    session = driver.session()
+def neo4j_session(
+    driver: Driver,
+    database: Optional[str] = None,
+    fetch_size: Optional[int] = None,
+) -> Iterable[Session]:
+    # Only pass options that are set, so the driver keeps its own defaults otherwise
+    options = {}  # type: Dict[str, Any]
+    if database:
+        options["database"] = database
+    if fetch_size:
+        options["fetch_size"] = fetch_size
+    session = driver.session(**options)
     try:
         yield session
     finally:
         session.close()
 
 
+def execute_read(session: Session, work: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run work(tx, *args) in a managed read transaction and return its result.
+    Uses session.execute_read on neo4j 5.x and session.read_transaction on 4.x
+    (Python 3.6). The driver may retry work on transient errors, so it must be
+    safe to run again.
+    """
+    run = getattr(session, "execute_read", None) or session.read_transaction
+    return run(work, *args)
+
+
 def run_query(
     session: Session,
     cypher: str,
@@ -48,12 +69,21 @@ def stream_query(
     session: Session,
     cypher: str,
     parameters: Optional[Dict[str, Any]] = None,
-    transform: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    transform: Optional[Callable[[Record], Any]] = None,
 ) -> Iterable[Any]:
+    """
+    Yield the query's records as they arrive, as dicts, or as transform(record)
+    when a transform is given. The transform gets the driver's Record itself,
+    which is indexed by key like a dict (e.g. transform=itemgetter("a", "b")),
+    so no intermediate dict is built per record.
+    """
     logger.debug("Streaming Cypher: %s", cypher)
     result = session.run(cypher, parameters or {})
-    for record in result:
-        data = record.data()
-        yield transform(data) if transform else data
+    if transform is None:
+        for record in result:
+            yield record.data()
+    else:
+        for record in result:
+            yield transform(record)
 
 
@@ -1,15 +1,27 @@
+import io
 import logging
+import os
 from contextlib import contextmanager
-from typing import Any, Dict, Iterable, List, Sequence
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR
 from psycopg2.extensions import connection as _PGConnection
-from psycopg2.extras import execute_batch
+from psycopg2.extras import execute_values
 
 from app_config.settings import PostgresConfig
 
 logger = logging.getLogger(__name__)
 
+# Rows per multi-row INSERT statement. PostgreSQL insert throughput levels off
+# around 1k rows per statement and degrades well past 10k; override with PG_BATCH_SIZE
+BATCH_PAGE_SIZE = int(os.getenv("PG_BATCH_SIZE", "1000"))
+
+# deferred_secondary_indexes only drops and rebuilds indexes when the load adds at
+# least this fraction of the rows already in the table; smaller loads are cheaper
+# with per-row index maintenance than with a full rebuild under an exclusive lock
+DEFER_INDEXES_MIN_FRACTION = 0.2
+
 
 def create_pg_connection(cfg: PostgresConfig) -> _PGConnection:
     logger.info(
@@ -47,16 +59,271 @@ def batch_insert(
     conn: _PGConnection,
     insert_sql: str,
     rows: Sequence[Sequence[Any]],
-    page_size: int = 1000,
+    page_size: int = BATCH_PAGE_SIZE,
 ) -> None:
     """
-    Efficiently insert many rows with a prepared INSERT statement.
+    Efficiently insert many rows: each page of rows is sent as one
+    multi-row INSERT ... VALUES statement.
     Example insert_sql:
-        INSERT INTO domains (id, name) VALUES (%s, %s)
+        INSERT INTO domains (id, name) VALUES %s
+
+    A single statement cannot ON CONFLICT DO UPDATE the same row twice, so
+    upserts need rows that are unique on the conflict key (see unique_rows).
     """
     logger.info("Inserting %s rows into PostgreSQL", len(rows))
     with conn.cursor() as cur:
-        execute_batch(cur, insert_sql, rows, page_size=page_size)
+        execute_values(cur, insert_sql, rows, page_size=page_size)
+
+
+def unique_rows(rows: Iterable[Sequence[Any]], key_index: int = 0) -> List[Sequence[Any]]:
+    """
+    Drop rows that repeat the key at key_index. The last row for a key wins,
+    as it would with one INSERT ... ON CONFLICT DO UPDATE per row, and keys
+    keep the position of their first occurrence.
+    """
+    return list({row[key_index]: row for row in rows}.values())
+
+
+# Backslash escapes for COPY text format fields
+_COPY_TEXT_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_text_field(value: Any) -> str:
+    """Format a value as a COPY text format field; None and "" become NULL."""
+    if value is None or value == "":
+        return "\\N"
+    return str(value).translate(_COPY_TEXT_ESCAPES)
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+    """
+    Stream rows into a table with COPY ... FROM STDIN (text format).
+    Fields are tab-separated with backslash escapes, so there is no CSV
+    quoting to do. None and empty strings are written as \\N and load as NULL.
+    """
+    buf = io.StringIO()
+    buf.writelines("\t".join(map(_copy_text_field, row)) + "\n" for row in rows)
+    buf.seek(0)
+    cur.copy_expert(
+        "COPY {} ({}) FROM STDIN".format(table, ", ".join(columns)),
+        buf,
+    )
+
+
+@contextmanager
+def staging_table(
+    cur,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    text_columns: Iterable[str] = (),
+) -> Iterable[str]:
+    """
+    COPY rows into a temporary table shaped like table(columns) and yield its
+    name; the staging table is dropped again on exit.
+
+    The staging table takes the target's column types but none of its
+    constraints, so it can be joined against or merged into the target with
+    plain SQL. Columns in text_columns are staged as raw text instead, for
+    values that are converted in SQL while merging.
+    """
+    stage = "_stage_" + table.split(".")[-1]
+    text_columns = set(text_columns)
+    select_list = ", ".join(
+        "NULL::text AS {}".format(column) if column in text_columns else column for column in columns
+    )
+    cur.execute("DROP TABLE IF EXISTS {}".format(stage))
+    cur.execute("CREATE TEMP TABLE {} AS SELECT {} FROM {} WITH NO DATA".format(stage, select_list, table))
+    copy_rows(cur, stage, columns, rows)
+    yield stage
+    cur.execute("DROP TABLE {}".format(stage))
+
+
+def copy_upsert(
+    conn: _PGConnection,
+    table: str,
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    conflict_columns: Sequence[str],
+    conversions: Optional[Dict[str, str]] = None,
+    skip_unchanged: bool = False,
+) -> int:
+    """
+    Bulk upsert: COPY the rows into a temporary staging table, then merge them
+    with a single INSERT ... SELECT ... ON CONFLICT DO UPDATE, which avoids
+    parsing and binding a statement per row.
+
+    Every column not in conflict_columns is updated on conflict. Rows must be
+    unique on conflict_columns, because one ON CONFLICT DO UPDATE statement
+    cannot change the same target row twice.
+
+    conversions maps a column to the SQL expression that produces its value
+    from the raw staged text, e.g. {"cost": "CAST(cost AS numeric)"}, so
+    parsing happens in PostgreSQL rather than per row in Python.
+
+    With skip_unchanged, a conflicting row is only updated when one of its
+    values differs, so re-running a load does not rewrite identical rows
+    (and their WAL) again.
+
+    Returns:
+        Number of rows inserted or updated
+    """
+    conversions = conversions or {}
+    column_list = ", ".join(columns)
+    select_list = ", ".join(conversions.get(column, column) for column in columns)
+    update_columns = [column for column in columns if column not in conflict_columns]
+    update_list = ", ".join("{0} = EXCLUDED.{0}".format(column) for column in update_columns)
+    action = "UPDATE SET " + update_list if update_list else "NOTHING"
+    if update_list and skip_unchanged:
+        action += " WHERE ({}) IS DISTINCT FROM ({})".format(
+            ", ".join("target." + column for column in update_columns),
+            ", ".join("EXCLUDED." + column for column in update_columns),
+        )
+    logger.info("Copying %s rows into %s", len(rows), table)
+    with conn.cursor() as cur:
+        with staging_table(cur, table, columns, rows, text_columns=conversions) as stage:
+            cur.execute(
+                "INSERT INTO {table} AS target ({columns}) SELECT {values} FROM {stage} "
+                "ON CONFLICT ({conflict}) DO {action}".format(
+                    table=table,
+                    columns=column_list,
+                    values=select_list,
+                    stage=stage,
+                    conflict=", ".join(conflict_columns),
+                    action=action,
+                )
+            )
+            return cur.rowcount
+
+
+def insert_returning(
+    conn: _PGConnection,
+    insert_sql: str,
+    rows: Sequence[Sequence[Any]],
+    template: Optional[str] = None,
+    page_size: int = BATCH_PAGE_SIZE,
+) -> List[Tuple]:
+    """
+    Insert many rows with multi-row VALUES statements and collect what the
+    RETURNING clause yields (one round-trip per page instead of per row).
+    Example insert_sql:
+        INSERT INTO domains (id, name) VALUES %s RETURNING id
+    """
+    logger.info("Inserting %s rows into PostgreSQL", len(rows))
+    with conn.cursor() as cur:
+        return execute_values(cur, insert_sql, rows, template=template, page_size=page_size, fetch=True)
+
+
+def has_unique_index(conn: _PGConnection, table: str, columns: Sequence[str]) -> bool:
+    """
+    Check whether table has a plain unique index on exactly these columns,
+    i.e. whether INSERT ... ON CONFLICT (columns) can use it as its arbiter.
+
+    Only reads the catalog; the migration never creates indexes itself.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT EXISTS (
+                SELECT 1
+                FROM pg_index x
+                WHERE x.indrelid = %s::regclass
+                  AND x.indisunique
+                  AND x.indpred IS NULL
+                  AND x.indexprs IS NULL
+                  AND (
+                      SELECT array_agg(a.attname::text ORDER BY a.attname::text)
+                      FROM pg_attribute a
+                      WHERE a.attrelid = x.indrelid AND a.attnum = ANY(x.indkey)
+                  ) = %s::text[]
+            )
+        """, (table, sorted(columns)))
+        (exists,) = cur.fetchone()
+    if not exists:
+        logger.warning("%s has no unique index on (%s)", table, ", ".join(columns))
+    return exists
+
+
+def drop_secondary_indexes(conn: _PGConnection, table: str) -> List[str]:
+    """
+    Drop the plain (non-unique, non-constraint) indexes of a table.
+    Primary keys, unique indexes and anything backing a constraint are kept
+    so ON CONFLICT targets keep working during the load.
+
+    Returns:
+        The CREATE INDEX statements needed to rebuild the dropped indexes
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT n.nspname, i.relname, pg_get_indexdef(x.indexrelid)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_namespace n ON n.oid = i.relnamespace
+            WHERE x.indrelid = %s::regclass
+              AND NOT x.indisprimary
+              AND NOT x.indisunique
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid
+              )
+        """, (table,))
+        indexes = cur.fetchall()
+
+        for schema, index_name, _ in indexes:
+            cur.execute('DROP INDEX "{}"."{}"'.format(schema, index_name))
+
+    if indexes:
+        logger.info("Dropped %s secondary indexes on %s", len(indexes), table)
+    return [index_def for _, _, index_def in indexes]
+
+
+def recreate_indexes(conn: _PGConnection, index_defs: Sequence[str]) -> None:
+    """Rebuild indexes from the statements returned by drop_secondary_indexes."""
+    with conn.cursor() as cur:
+        for index_def in index_defs:
+            cur.execute(index_def)
+    if index_defs:
+        logger.info("Recreated %s secondary indexes", len(index_defs))
+
+
+def estimated_row_count(conn: _PGConnection, table: str) -> int:
+    """Planner estimate of the rows in table (pg_class.reltuples); 0 if never analyzed."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", (table,))
+        (reltuples,) = cur.fetchone()
+    # reltuples is -1 on PostgreSQL 14+ for tables not yet vacuumed or analyzed
+    return max(int(reltuples), 0)
+
+
+@contextmanager
+def deferred_secondary_indexes(conn: _PGConnection, table: str, row_count: int) -> Iterable[None]:
+    """
+    Drop secondary indexes on table for the duration of a bulk load of
+    row_count rows and rebuild each of them once afterwards, instead of
+    maintaining them per row.
+
+    The rebuild rescans the whole table and DROP INDEX holds an ACCESS EXCLUSIVE
+    lock until commit, so indexes are only deferred when row_count is at least
+    DEFER_INDEXES_MIN_FRACTION of the table's estimated size; smaller loads
+    run with the indexes in place.
+
+    DROP/CREATE INDEX run inside the caller's transaction (CONCURRENTLY is not
+    allowed there), so if the load aborts the transaction the rollback done by
+    pg_connection restores the original indexes.
+    """
+    table_rows = estimated_row_count(conn, table)
+    if row_count < table_rows * DEFER_INDEXES_MIN_FRACTION:
+        logger.debug(
+            "Keeping indexes on %s: loading %s rows into about %s", table, row_count, table_rows
+        )
+        yield
+        return
+    index_defs = drop_secondary_indexes(conn, table)
+    try:
+        yield
+    finally:
+        if conn.get_transaction_status() == TRANSACTION_STATUS_INERROR:
+            logger.warning("Transaction aborted; indexes on %s are restored by rollback", table)
+        else:
+            recreate_indexes(conn, index_defs)
 
 
 def fetch_asset_types(conn: _PGConnection) -> List[Dict[str, Any]]:
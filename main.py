@@ -1,35 +1,42 @@
 import argparse
 import logging
+import logging.handlers
 from typing import Callable, List, Tuple
 
 from neo4j import Session
 from psycopg2.extensions import connection as _PGConnection
 
 from app_config.settings import EnvName, get_config
+from app_config.utils import flush_log_handlers
 from db.neo4j_utils import create_neo4j_driver, neo4j_session
 from db.postgres_utils import pg_connection
 from migrations.community_migration import migrate_communities
 from migrations.client_migration import migrate_clients
 from migrations.complete_migration import run_migration
-from migrations.type_migration import migrate_types
+from migrations.type_migration import migrate_types, migrate_types_direct
 from migrations.asset_type_migration import migrate_asset_types, fetch_asset_types_from_db
 from migrations.neo4j_export import export_neo4j_to_csv
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
 logger = logging.getLogger(__name__)
 
-# Type alias for migration function
-MigrationFn = Callable[[Session, _PGConnection], None]
 
-# Adapter to plug the CSV-based step-by-step flow into the standard signature
-def run_step_by_step_migration(_: Session, conn: _PGConnection):
-    # type: (Session, _PGConnection) -> None
-    """Run the interactive CSV migration that only needs PostgreSQL."""
-    run_migration(conn)
+def configure_logging(quiet=False):
+    # type: (bool) -> None
+    """Send log output through a buffered handler; --quiet keeps only warnings and errors."""
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    # Buffer records and write them in bursts; warnings and errors flush immediately
+    buffered_handler = logging.handlers.MemoryHandler(
+        capacity=100,
+        flushLevel=logging.WARNING,
+        target=stream_handler,
+    )
+    root = logging.getLogger()
+    root.setLevel(logging.WARNING if quiet else logging.INFO)
+    root.addHandler(buffered_handler)
 
+# Type alias for migration function
+MigrationFn = Callable[[Session, _PGConnection], None]
 
 # Adapter for type migration (CSV-based)
 def run_type_migration(_: Session, conn: _PGConnection):
@@ -38,6 +45,13 @@ def run_type_migration(_: Session, conn: _PGConnection):
     migrate_types(_, conn)
 
 
+# Adapter for type migration straight from Neo4j (no CSV file)
+def run_type_direct_migration(session: Session, conn: _PGConnection):
+    # type: (Session, _PGConnection) -> None
+    """Run the type migration from Neo4j without the intermediate CSV file."""
+    migrate_types_direct(session, conn)
+
+
 # Adapter for asset type migration (CSV-based)
 def run_asset_type_migration(_: Session, conn: _PGConnection):
     # type: (Session, _PGConnection) -> None
@@ -54,18 +68,32 @@ def run_fetch_asset_types(_: Session, conn: _PGConnection):
 
 # Factory functions that create migration functions with config values
 def create_neo4j_export_fn(cfg) -> MigrationFn:
-    """Create a Neo4j export function with config values."""
+    """Create a Neo4j export function with config values, exporting on concurrent sessions."""
     def run_neo4j_export(session: Session, _: _PGConnection) -> None:
         """Export data from Neo4j to CSV files."""
-        export_neo4j_to_csv(
-            session, 
-            _, 
-            batch_size=cfg.neo4j_export_batch_size,
-            subcommunity_csv="subcommunityids.csv"
-        )
+        # The driver is thread-safe (sessions are not), so worker sessions come from one driver
+        export_driver = create_neo4j_driver(cfg.neo4j)
+        try:
+            export_neo4j_to_csv(
+                session, 
+                _, 
+                batch_size=cfg.neo4j_export_batch_size,
+                subcommunity_csv="subcommunityids.csv",
+                open_session=lambda: neo4j_session(export_driver, cfg.neo4j.database, cfg.neo4j.fetch_size),
+            )
+        finally:
+            export_driver.close()
     return run_neo4j_export
 
 
+def create_step_by_step_migration_fn(cfg) -> MigrationFn:
+    """Create the interactive CSV migration, which can open extra PostgreSQL connections."""
+    def run_step_by_step_migration(_: Session, conn: _PGConnection) -> None:
+        """Run the interactive CSV migration that only needs PostgreSQL."""
+        run_migration(conn, connect=lambda: pg_connection(cfg.postgres))
+    return run_step_by_step_migration
+
+
 def create_community_migration_fn(cfg) -> MigrationFn:
     """Create a community migration function with config values."""
     def run_community_migration(session: Session, conn: _PGConnection) -> None:
@@ -84,7 +112,8 @@ MIGRATION_FACTORIES = [
     ("Asset type migration", lambda cfg: run_asset_type_migration),
     ("Fetch asset types", lambda cfg: run_fetch_asset_types),
     ("Neo4j to CSV export", create_neo4j_export_fn),
-    ("Step-by-step migration", lambda cfg: run_step_by_step_migration),
+    ("Step-by-step migration", create_step_by_step_migration_fn),
+    ("Type migration (direct from Neo4j)", lambda cfg: run_type_direct_migration),
 ]
 
 def build_migrations(cfg):
@@ -104,6 +133,7 @@ MIGRATION_KEY_MAP_INDICES = {
     "export": 5,
     "neo4j-export": 5,
     "step": 6,
+    "type-direct": 7,
 }
 
 
@@ -119,9 +149,14 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument(
         "--migration",
-        choices=["export", "neo4j-export", "community", "client", "type", "asset-type", "fetch-asset-types", "step"],
+        choices=["export", "neo4j-export", "community", "client", "type", "type-direct", "asset-type", "fetch-asset-types", "step"],
         help="Optional: run specific migration without interactive prompt",
     )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Only report warnings and errors; interactive menus are still shown",
+    )
     return parser.parse_args()
 
 
@@ -129,6 +164,7 @@ def show_migration_menu(cfg):
     # type: (...) -> List[Tuple[str, MigrationFn]]
     """Display menu and return selected migrations."""
     migrations = build_migrations(cfg)
+    flush_log_handlers()
     print("\n" + "="*50)
     print("MIGRATION MENU")
     print("="*50)
@@ -168,6 +204,7 @@ def main():
     # type: () -> None
     """Main migration entry point."""
     args = parse_args()
+    configure_logging(args.quiet)
     env: EnvName = args.env
     cfg = get_config(env)
 
@@ -177,36 +214,27 @@ def main():
     
     logger.info("Environment: %s", env)
     logger.info("Selected migrations: %s", selected_names)
-    print(f"\n→ Running: {selected_names}\n")
 
     # Create Neo4j driver
     driver = create_neo4j_driver(cfg.neo4j)
     
     try:
-        with neo4j_session(driver) as nsession:
+        with neo4j_session(driver, cfg.neo4j.database, cfg.neo4j.fetch_size) as nsession:
             for name, migration_fn in selected_migrations:
                 logger.info("Running '%s'", name)
-                print(f"\n{'='*50}")
-                print(f"Running: {name}")
-                print(f"{'='*50}\n")
                 
                 try:
                     with pg_connection(cfg.postgres) as conn:
                         migration_fn(nsession, conn)
                     logger.info("✓ %s completed successfully", name)
-                    print(f"\n✓ {name} completed successfully\n")
                 except Exception as e:
                     logger.error("✗ %s failed: %s", name, str(e))
-                    print(f"\n✗ {name} failed: {str(e)}\n")
                     raise
     finally:
         driver.close()
         logger.info("Neo4j driver closed")
 
-    logger.info("All migrations finished successfully for env=%s", env)
-    print(f"\n{'='*50}")
-    print("✓ ALL MIGRATIONS COMPLETED SUCCESSFULLY")
-    print(f"{'='*50}\n")
+    logger.info("✓ All migrations finished successfully for env=%s", env)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,7 @@
 import csv
 import logging
+from itertools import chain, count
+from operator import itemgetter
 from pathlib import Path
 from typing import Dict, List, Sequence, Tuple, Union
 
@@ -7,7 +9,8 @@ from neo4j import Session
 from psycopg2.extensions import connection as _PGConnection
 
 from db.postgres_utils import batch_insert, fetch_asset_types
-from db.neo4j_utils import run_query
+from db.neo4j_utils import stream_query
+from app_config.utils import clean_csv_value
 
 logger = logging.getLogger(__name__)
 
@@ -28,35 +31,34 @@ def export_asset_types_from_neo4j(session: Session, csv_file_path: Union[str, Pa
                child.templateName AS child_template_name
     """
     
+    # Define fieldnames based on the query
+    fieldnames = ("parent_name", "child_name", "child_template_name")
+    
     try:
-        records = run_query(session, cypher)
+        # Rows stream from the driver as tuples in fieldnames order and are written as they arrive
+        records = stream_query(session, cypher, transform=itemgetter(*fieldnames))
+        first_record = next(records, None)
         
-        if not records:
+        if first_record is None:
             logger.warning("No asset type data found in Neo4j")
-            print("No asset type data found in Neo4j")
             return
         
         csv_path = Path(csv_file_path)
-        logger.info("Saving %s asset type records to %s", len(records), csv_path)
-        
-        # Define fieldnames based on the query
-        fieldnames = ["parent_name", "child_name", "child_template_name"]
+        logger.info("Saving asset type records to %s", csv_path)
         
+        record_count = 0
         with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_MINIMAL)
-            writer.writeheader()
+            writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(fieldnames)
             
-            for record in records:
-                # Convert None values to empty strings for CSV
-                row = {k: (v if v is not None else '') for k, v in record.items()}
-                writer.writerow(row)
+            # csv.writer writes None values as empty strings
+            for record_count, record in enumerate(chain((first_record,), records), 1):
+                writer.writerow(record)
         
-        logger.info("Successfully saved %s asset type records to %s", len(records), csv_path)
-        print(f"✓ Exported {len(records)} asset type records to {csv_path}")
+        logger.info("Successfully saved %s asset type records to %s", record_count, csv_path)
         
     except Exception as e:
         logger.error("Failed to export asset types from Neo4j: %s", str(e), exc_info=True)
-        print(f"✗ Failed to export asset types from Neo4j: {e}")
         raise
 
 
@@ -79,14 +81,22 @@ def read_asset_type_csv(csv_file_path: Union[str, Path] = "AssetTypeToMigrate.cs
                     cleaned_row[clean_key] = None
                 elif isinstance(v, str):
                     # Strip quotes from beginning and end, then strip whitespace
-                    v = v.strip().strip('"').strip("'").strip()
-                    cleaned_row[clean_key] = v if v else None
+                    cleaned_row[clean_key] = clean_csv_value(v)
                 else:
                     cleaned_row[clean_key] = v
             rows.append(cleaned_row)
         return rows
 
 
+def _clean_value(value):
+    """Strip quotes and whitespace from a string value; empty strings become None."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return clean_csv_value(value)
+    return value
+
+
 def map_asset_types_to_rows(asset_type_data, start_id=1):
     # type: (List[Dict], int) -> Sequence[Tuple]
     """Map CSV data to database rows for asset_type table.
@@ -104,60 +114,36 @@ def map_asset_types_to_rows(asset_type_data, start_id=1):
         start_id: Starting ID for BIGINT generation (default: 1)
     """
     logger.info("Mapping asset types to database rows")
-    rows = []  # type: List[Tuple]
+    valid_records = []  # type: List[Tuple]
     skipped_count = 0
-    current_id = start_id
     
     for record in asset_type_data:
-        try:
-            name = record.get("child_name")
-            parent_name = record.get("parent_name")
-            template_name = record.get("child_template_name")
-            
-            # Skip if name is missing or empty (required field)
-            if not name:
-                logger.warning("Skipping record with missing child_name: %s", record)
-                skipped_count += 1
-                continue
-            
-            # Ensure values are cleaned (strip quotes and whitespace, convert empty to None)
-            def clean_value(value):
-                if value is None:
-                    return None
-                if isinstance(value, str):
-                    value = value.strip().strip('"').strip("'").strip()
-                    return value if value else None
-                return value
-            
-            name = clean_value(name)
-            parent_name = clean_value(parent_name)
-            template_name = clean_value(template_name)
-            
-            # Skip if name is empty after cleaning
-            if not name:
-                logger.warning("Skipping record with empty child_name after cleaning: %s", record)
-                skipped_count += 1
-                continue
-            
-            # Generate BIGINT id sequentially
-            asset_type_id = current_id
-            current_id += 1
-            
-            # parent_name and template_name can be None
-            rows.append(
-                (
-                    asset_type_id,  # id (BIGINT)
-                    name,  # name
-                    parent_name,  # parent_name (None if empty)
-                    "ACTIVE",  # status (default)
-                    template_name,  # template_name (None if empty)
-                    "emaar",  # client_id (hardcoded)
-                )
-            )
-        except Exception as e:
-            logger.error("Error mapping asset type record %s: %s", record.get("child_name", "unknown"), str(e))
+        # Ensure values are cleaned (strip quotes and whitespace, convert empty to None)
+        name = _clean_value(record.get("child_name"))
+        
+        # Skip if name is missing or empty after cleaning (required field)
+        if not name:
+            logger.warning("Skipping record with missing child_name: %s", record)
             skipped_count += 1
             continue
+        
+        # parent_name and template_name can be None
+        valid_records.append(
+            (name, _clean_value(record.get("parent_name")), _clean_value(record.get("child_template_name")))
+        )
+    
+    # Generate BIGINT ids sequentially, in one pass over the valid records
+    rows = [
+        (
+            asset_type_id,  # id (BIGINT)
+            name,  # name
+            parent_name,  # parent_name (None if empty)
+            "ACTIVE",  # status (default)
+            template_name,  # template_name (None if empty)
+            "emaar",  # client_id (hardcoded)
+        )
+        for asset_type_id, (name, parent_name, template_name) in zip(count(start_id), valid_records)
+    ]  # type: List[Tuple]
     
     if skipped_count > 0:
         logger.warning("Skipped %s invalid asset type records during mapping", skipped_count)
@@ -182,7 +168,6 @@ def migrate_asset_types(session: Session, conn: _PGConnection, csv_file_path: Un
     csv_path = Path(csv_file_path)
     if not csv_path.exists():
         logger.info("CSV file not found at %s, fetching from Neo4j...", csv_path)
-        print(f"CSV file not found. Fetching asset type data from Neo4j...")
         export_asset_types_from_neo4j(session, csv_file_path)
     
     try:
@@ -201,11 +186,9 @@ def migrate_asset_types(session: Session, conn: _PGConnection, csv_file_path: Un
 
         if not rows:
             logger.info("No asset types found to migrate")
-            print("No asset types to migrate")
             return
         
         logger.info("Preparing to insert %s asset type rows into PostgreSQL", len(rows))
-        print(f"Preparing to insert {len(rows)} asset types...")
         
         insert_sql = """
             INSERT INTO public.asset_type (
@@ -216,7 +199,7 @@ def migrate_asset_types(session: Session, conn: _PGConnection, csv_file_path: Un
                 template_name,
                 client_id
             )
-            VALUES (%s, %s, %s, %s, %s, %s)
+            VALUES %s
             ON CONFLICT (id) DO UPDATE SET
                 name = EXCLUDED.name,
                 parent_name = EXCLUDED.parent_name,
@@ -227,10 +210,8 @@ def migrate_asset_types(session: Session, conn: _PGConnection, csv_file_path: Un
 
         batch_insert(conn, insert_sql, rows)
         logger.info("Asset type migration completed successfully. Migrated %s rows", len(rows))
-        print(f"✓ Migrated {len(rows)} asset types")
     except Exception as e:
         logger.error("Asset type migration failed: %s", str(e), exc_info=True)
-        print(f"✗ Asset type migration failed: {e}")
         raise
 
 
@@ -250,11 +231,9 @@ def fetch_asset_types_from_db(_: Session, conn: _PGConnection, csv_file_path: Un
         
         if not asset_types:
             logger.info("No asset types found in database")
-            print("No asset types found in database")
             return
         
         logger.info("Successfully fetched %s asset types", len(asset_types))
-        print(f"\n✓ Fetched {len(asset_types)} asset types from public.asset_type")
         
         # Save to CSV file
         csv_path = Path(csv_file_path)
@@ -274,21 +253,15 @@ def fetch_asset_types_from_db(_: Session, conn: _PGConnection, csv_file_path: Un
                 writer.writerow(row)
         
         logger.info("Successfully saved %s asset types to %s", len(asset_types), csv_path)
-        print(f"✓ Saved {len(asset_types)} asset types to {csv_path}")
         
-        # Display first few records as sample
-        if asset_types:
-            print("\nSample records (first 5):")
-            print("-" * 80)
-            for i, asset_type in enumerate(asset_types[:5], 1):
-                print(f"{i}. {asset_type}")
-            if len(asset_types) > 5:
-                print(f"... and {len(asset_types) - 5} more records")
-            print("-" * 80)
+        # Log the first few records as a sample
+        for i, asset_type in enumerate(asset_types[:5], 1):
+            logger.info("Sample record %s: %s", i, asset_type)
+        if len(asset_types) > 5:
+            logger.info("... and %s more records", len(asset_types) - 5)
         
         return asset_types
     except Exception as e:
         logger.error("Failed to fetch asset types: %s", str(e), exc_info=True)
-        print(f"✗ Failed to fetch asset types: {e}")
         raise
 
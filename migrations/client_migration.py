@@ -12,10 +12,10 @@ from re import split
 logger = logging.getLogger(__name__)
 
 
-def fetch_clients(session: Session):
-    # type: (Session) -> Iterable[Dict]
+def fetch_clients(session: Session, root_client_id: str = "datalkz"):
+    # type: (Session, str) -> Iterable[Dict]
     cypher = """
-        MATCH (root:DefaultTenant {clientId: 'datalkz'})
+        MATCH (root:DefaultTenant {clientId: $root_client_id})
         RETURN
             root.clientId AS client_id,
             root.clientName AS client_name,
@@ -32,7 +32,7 @@ def fetch_clients(session: Session):
 
         UNION
 
-        MATCH (:DefaultTenant {clientId: 'datalkz'})-[:tenant*]->(child)
+        MATCH (:DefaultTenant {clientId: $root_client_id})-[:tenant*]->(child)
         RETURN
             child.clientId AS client_id,
             child.clientName AS client_name,
@@ -50,7 +50,7 @@ def fetch_clients(session: Session):
         ORDER BY client_id;
 
     """
-    return run_query(session, cypher)
+    return run_query(session, cypher, {"root_client_id": root_client_id})
 
 
 def map_clients_to_rows(clients):
@@ -178,10 +178,6 @@ def migrate_clients(session: Session, conn: _PGConnection):
     # This is necessary because colony has a foreign key constraint to client_id
     rows = sort_rows_for_foreign_key(rows)
     
-    print("DEBUG row count =", len(rows))
-    if rows:
-        print("DEBUG row details =", rows[0])
-    
     insert_sql = """
         INSERT INTO public.clients (
             client_id,
@@ -196,7 +192,7 @@ def migrate_clients(session: Session, conn: _PGConnection):
             created_by,
             created_on
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES %s
         ON CONFLICT (client_id) DO UPDATE SET
             client_name = EXCLUDED.client_name,
             location = EXCLUDED.location,
@@ -5,7 +5,7 @@ from neo4j import Session
 from psycopg2.extensions import connection as _PGConnection
 
 from db.neo4j_utils import run_query
-from db.postgres_utils import batch_insert
+from db.postgres_utils import batch_insert, unique_rows
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +13,7 @@ logger = logging.getLogger(__name__)
 def fetch_communities(session: Session, domain: str = "ecd"):
     # type: (Session, str) -> Iterable[Dict]
     logger.info("Fetching communities from Neo4j with domain: %s", domain)
-    cypher = f"""
+    cypher = """
     MATCH (n:Community)
     RETURN
         n.clientId AS client_id,
@@ -120,7 +120,7 @@ def migrate_communities(session: Session, conn: _PGConnection, domain: str = "ec
                 created_on,
                 reference_number
             )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            VALUES %s
             ON CONFLICT (client_id) DO UPDATE SET
                 client_name = EXCLUDED.client_name,
                 location = EXCLUDED.location,
@@ -135,7 +135,8 @@ def migrate_communities(session: Session, conn: _PGConnection, domain: str = "ec
                 reference_number = EXCLUDED.reference_number
         """
 
-        batch_insert(conn, insert_sql, rows)
+        # One community per client_id: a multi-row upsert cannot update a row twice
+        batch_insert(conn, insert_sql, unique_rows(rows))
         logger.info("Community migration completed successfully. Migrated %s rows", len(rows))
     except Exception as e:
         logger.error("Community migration failed: %s", str(e), exc_info=True)
@@ -1,56 +1,120 @@
 import csv
 import logging
 import re
-import uuid
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Tuple, Union
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 from psycopg2.extensions import connection as _PGConnection
-from db.postgres_utils import batch_insert
-from app_config.utils import convert_epoch_to_timestamp
+from db.postgres_utils import (
+    batch_insert,
+    copy_upsert,
+    deferred_secondary_indexes,
+    has_unique_index,
+    insert_returning,
+    staging_table,
+)
+from app_config.utils import bulk_uuids, clean_csv_value, convert_epoch_to_timestamp, flush_log_handlers
 
 logger = logging.getLogger(__name__)
 
+# Epoch values repeat heavily across records (shared open/close/created times),
+# so conversions are cached instead of rebuilding the same datetime per row
+_cached_epoch_to_timestamp = lru_cache(maxsize=8192)(convert_epoch_to_timestamp)
+
+# Numeric CSV fields are loaded as text and parsed by PostgreSQL while inserting;
+# anything that is not a valid number becomes NULL
+_SQL_INT = r"CAST(substring({} FROM '^\s*([-+]?[0-9]+)\s*$') AS integer)"
+_SQL_FLOAT = r"CAST(substring({} FROM '^\s*([-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?)\s*$') AS double precision)"
+
+# Status for entities whose CSV status is empty. Defaults are applied only when a
+# row is first built, not for every record that repeats its key
+_DEFAULT_STATUS = "ACTIVE"
+
+# Opens a new PostgreSQL connection, e.g. lambda: pg_connection(cfg.postgres)
+ConnectionFactory = Callable[[], ContextManager[_PGConnection]]
+
+# Valid answers for the data migration menu (see show_menu)
+_MENU_CHOICES = frozenset({'1', '2', '3', '4', '5', '6', '7'})
+
+# Menu choice that runs every step in order instead of a single one
+_RUN_ALL_CHOICE = '7'
+
+# CSV columns used by build_all_rows, in the order each record tuple is unpacked.
+# read_csv_data projects every CSV row onto this order, so records are plain
+# tuples instead of per-row dicts
+RECORD_FIELDS = (
+    # Subcommunity
+    "sub_community_id", "sub_community_location", "sub_community_name",
+    "sub_community_status", "community_id", "sub_community_domain", "sub_community_type",
+    # Building
+    "building_id", "building_name", "building_status", "building_location",
+    "building_site_code", "building_open_time", "building_close_time", "building_domain",
+    "building_type", "building_created_by", "building_created_on",
+    # Space
+    "spaces_id", "spaces_layout", "spaces_name", "spaces_status", "spaces_domain", "spaces_type",
+    # Asset
+    "asset_id", "asset_code", "cost_of_purchase", "created_by", "created_on", "asset_name",
+    "asset_make", "asset_model", "asset_status", "asset_updated_by", "asset_updated_on",
+    "analytics_profile_id", "asset_domain", "asset_settings_id", "active_contract", "asset_type",
+    # Point
+    "point_name", "point_status", "access_type", "point_data_type", "point_display_name",
+    "remote_data_type", "point_symbol", "point_unit", "point_expression", "point_precedence",
+)
+
 
 def read_csv_data(csv_file_path: Union[str, Path] = "buildingdemodata.csv"):
-    # type: (Union[str, Path]) -> List[Dict]
-    """Read data from a single CSV file."""
+    # type: (Union[str, Path]) -> Iterator[Tuple]
+    """Yield the records of a single CSV file as tuples ordered like RECORD_FIELDS.
+    
+    Columns missing from the file come back as None. Records are read lazily,
+    so the file is only opened once iteration starts.
+    """
     csv_path = Path(csv_file_path)
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV file not found: {csv_path}")
     
-    with open(csv_path, 'r', encoding='utf-8-sig') as f:  # utf-8-sig handles BOM
-        reader = csv.DictReader(f)
-        rows = []
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:  # utf-8-sig handles BOM
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        
+        # Normalize the column names once instead of per row: remove BOM and
+        # map 'identifier' to 'asset_id' for backward compatibility
+        positions = {}  # type: Dict[str, int]
+        for index, key in enumerate(header):
+            key = key.lstrip('\ufeff')
+            positions['asset_id' if key == 'identifier' else key] = index
+        
+        # Columns absent from the file read the None appended past the last column
+        width = len(header)
+        pick = itemgetter(*(positions.get(field, width) for field in RECORD_FIELDS))
+        
+        # Strip quotes and whitespace from values, convert empty strings to None
         for row in reader:
-            # Clean up keys (remove BOM if present) and normalize asset_id/identifier
-            cleaned_row = {}
-            for k, v in row.items():
-                # Remove BOM from key names
-                clean_key = k.lstrip('\ufeff')
-                # Map 'identifier' to 'asset_id' for backward compatibility
-                if clean_key == 'identifier':
-                    clean_key = 'asset_id'
-                
-                # Strip quotes and whitespace from values, convert empty strings to None
-                if v is None:
-                    cleaned_row[clean_key] = None
-                elif isinstance(v, str):
-                    # Strip quotes from beginning and end, then strip whitespace
-                    v = v.strip().strip('"').strip("'").strip()
-                    cleaned_row[clean_key] = v if v else None
-                else:
-                    cleaned_row[clean_key] = v
-            rows.append(cleaned_row)
-        return rows
+            if not row:
+                continue
+            if len(row) != width:
+                # Ragged row: pad or truncate to the header width
+                row = row[:width] + [None] * (width - len(row))
+            row.append(None)
+            yield tuple(map(clean_csv_value, pick(row)))
 
 
 def read_multiple_csv_files(csv_file_pattern: Union[str, Path] = "data_*.csv", base_dir: Union[str, Path] = "data"):
-    # type: (Union[str, Path], Union[str, Path]) -> List[Dict]
+    # type: (Union[str, Path], Union[str, Path]) -> Iterator[Tuple]
     """Read data from multiple CSV files matching a pattern.
     
-    This function reads ALL matching CSV files first, then returns the combined data.
-    Deduplication happens later during migration processing.
+    The matching files are resolved (and a missing match reported) immediately;
+    their records are then streamed file by file as the result is iterated, so
+    the combined data is never held in memory. Deduplication happens later
+    during migration processing.
     
     Args:
         csv_file_pattern: Pattern to match CSV files (e.g., "data_*.csv" or "data_1.csv")
@@ -59,7 +123,7 @@ def read_multiple_csv_files(csv_file_pattern: Union[str, Path] = "data_*.csv", b
         base_dir: Base directory to search for CSV files (default: "data")
     
     Returns:
-        Combined list of all records from all matching CSV files (before deduplication)
+        Iterator over the records of all matching CSV files (before deduplication)
     """
     base_path = Path(base_dir)
     pattern = str(csv_file_pattern)
@@ -92,129 +156,29 @@ def read_multiple_csv_files(csv_file_pattern: Union[str, Path] = "data_*.csv", b
         return tuple(int(part) if part.isdigit() else part.lower() for part in parts)
     
     csv_files = sorted(csv_files, key=natural_sort_key)
-    
-    all_rows = []
+    logger.info("Found %s CSV file(s) to process", len(csv_files))
+    return _stream_csv_files(csv_files)
+
+
+def _stream_csv_files(csv_files):
+    # type: (Sequence[Path]) -> Iterator[Tuple]
+    """Yield the records of each file in turn, logging per-file and total counts."""
     total_files = len(csv_files)
-    
-    print(f"Found {total_files} CSV file(s) to process:")
-    for idx, csv_file in enumerate(csv_files, 1):
-        print(f"  {idx}. {csv_file.name}")
-    
-    # STEP 1: Read ALL files first (don't process/insert yet)
-    print(f"\n{'='*60}")
-    print("STEP 1: Reading all CSV files...")
-    print(f"{'='*60}")
+    total_records = 0
+    logger.info("STEP 1: Streaming CSV files...")
     for idx, csv_file in enumerate(csv_files, 1):
-        print(f"\nReading file {idx}/{total_files}: {csv_file.name}...")
+        count = 0
         try:
-            rows = read_csv_data(csv_file)
-            all_rows.extend(rows)
-            print(f"  ✓ Loaded {len(rows)} records from {csv_file.name}")
+            for record in read_csv_data(csv_file):
+                count += 1
+                yield record
         except Exception as e:
             logger.error(f"Error reading {csv_file.name}: {e}")
-            print(f"  ✗ Error reading {csv_file.name}: {e}")
             raise
+        total_records += count
+        logger.info("  ✓ Loaded %s records from %s (%s/%s)", count, csv_file.name, idx, total_files)
     
-    print(f"\n{'='*60}")
-    print(f"✓ All files read. Total records loaded: {len(all_rows)} from {total_files} file(s)")
-    print(f"{'='*60}\n")
-    
-    return all_rows
-
-
-def get_subcommunity_rows(data):
-    # type: (List[Dict]) -> List[Tuple]
-    """Extract unique subcommunities."""
-    seen = set()
-    rows = []
-    for record in data:
-        sub_id = record.get("sub_community_id")
-        if sub_id and sub_id not in seen:
-            seen.add(sub_id)
-            rows.append((
-                sub_id,
-                record.get("sub_community_location"),
-                record.get("sub_community_name"),
-                record.get("sub_community_status") or "ACTIVE",
-                record.get("community_id"),
-                record.get("sub_community_domain"),
-                record.get("sub_community_type")
-            ))
-    return rows
-
-
-def get_building_rows(data):
-    # type: (List[Dict]) -> List[Tuple]
-    """Extract unique buildings."""
-    seen = set()
-    rows = []
-    for record in data:
-        bldg_id = record.get("building_id")
-        if bldg_id and bldg_id not in seen:
-            seen.add(bldg_id)
-            rows.append((
-                bldg_id,
-                record.get("building_name"),
-                record.get("building_status") or "ACTIVE",
-                record.get("building_location"),
-                record.get("building_site_code"),
-                convert_epoch_to_timestamp(record.get("building_open_time")) if record.get("building_open_time") else None,
-                convert_epoch_to_timestamp(record.get("building_close_time")) if record.get("building_close_time") else None,
-                record.get("building_domain"),
-                record.get("building_type"),
-                record.get("building_created_by"),
-                convert_epoch_to_timestamp(record.get("building_created_on")) if record.get("building_created_on") else None,
-                record.get("sub_community_id")
-            ))
-    return rows
-
-
-def get_space_rows(data):
-    # type: (List[Dict]) -> List[Tuple]
-    """Extract unique spaces."""
-    seen = set()
-    rows = []
-    skipped_count = 0
-    for record in data:
-        space_id = record.get("spaces_id")
-        if not space_id:
-            skipped_count += 1
-            continue
-        if space_id == "null":
-            continue
-        
-        if space_id in seen:
-            continue
-        
-        building_id = record.get("building_id")
-        layout_raw = record.get("spaces_layout")
-        try:
-            layout = int(layout_raw)
-        except (TypeError, ValueError):
-            layout = 0
-        
-        if not building_id:
-            logger.warning("Skipping space %s due to missing building_id", space_id)
-            skipped_count += 1
-            continue
-        
-        seen.add(space_id)
-        rows.append(
-            (
-                space_id,
-                layout,
-                record.get("spaces_name"),
-                record.get("spaces_status") or "ACTIVE",
-                building_id,
-                record.get("spaces_domain"),
-                record.get("spaces_type"),
-            )
-        )
-    
-    if skipped_count > 0:
-        logger.info(f"Skipped {skipped_count} records with missing or empty space_id")
-    
-    return rows
+    logger.info("✓ All files read. Total records loaded: %s from %s file(s)", total_records, total_files)
 
 
 def load_asset_type_map(asset_type_csv: Union[str, Path] = "assetType.csv"):
@@ -239,266 +203,242 @@ def load_asset_type_map(asset_type_csv: Union[str, Path] = "assetType.csv"):
     return mapping
 
 
-def _safe_float(value):
-    # type: (Union[str, None]) -> Union[float, None]
-    if value in (None, "", "null"):
-        return None
-    try:
-        return float(value)
-    except (TypeError, ValueError):
+def _ts(value):
+    # type: (Union[str, None]) -> Union[datetime, None]
+    """Convert a CSV epoch value to a timestamp, or None when it is empty."""
+    if not value:
         return None
+    return _cached_epoch_to_timestamp(value)
 
 
-def get_asset_rows(data, asset_type_map):
-    # type: (List[Dict], Dict[str, str]) -> List[Tuple]
-    """Extract unique assets."""
-    seen = set()
-    rows = []
-    skipped_count = 0
-    for record in data:
-        asset_id = record.get("asset_id")
-        if not asset_id:
-            skipped_count += 1
-            continue
-        if asset_id in seen:
-            continue
-        seen.add(asset_id)
+@dataclass
+class MigrationPlan:
+    """Unique rows of every entity, extracted from the CSV records in one pass.
 
-        asset_type_name = (record.get("asset_type") or "").strip()
-        asset_type_id = asset_type_map.get(asset_type_name)
-        if asset_type_name and not asset_type_id:
-            logger.warning("Asset type '%s' not found in lookup table", asset_type_name)
+    The plan is built once per run and every menu step migrates from it (see
+    run_plan), so no step rescans the CSV data.
 
-        rows.append(
-            (
-                asset_id,
-                record.get("asset_code"),
-                _safe_float(record.get("cost_of_purchase")),
-                record.get("created_by"),
-                convert_epoch_to_timestamp(record.get("created_on")) if record.get("created_on") else None,
-                record.get("asset_name"),
-                record.get("asset_make"),
-                record.get("asset_model"),
-                record.get("asset_status") or "ACTIVE",
-                record.get("asset_updated_by"),
-                convert_epoch_to_timestamp(record.get("asset_updated_on")) if record.get("asset_updated_on") else None,
-                record.get("analytics_profile_id"),
-                record.get("community_id"),
-                record.get("asset_domain"),
-                record.get("asset_settings_id"),
-                record.get("building_id"),
-                record.get("sub_community_id"),
-                record.get("active_contract"),
-                asset_type_id,
+    asset_point_rows and asset_type_point_rows end with the point_name, because
+    data_point ids only exist once the data points are inserted; see
+    resolve_point_rows.
+    """
+    subcommunity_rows: List[Tuple]
+    building_rows: List[Tuple]
+    space_rows: List[Tuple]
+    asset_rows: List[Tuple]
+    asset_space_rows: List[Tuple]
+    data_point_rows: List[Tuple]
+    asset_point_rows: List[Tuple]
+    asset_type_point_rows: List[Tuple]
+
+    @classmethod
+    def from_data(cls, data, asset_type_map):
+        # type: (Iterable[Tuple], Dict[str, str]) -> MigrationPlan
+        """Build the plan from CSV records; see build_all_rows."""
+        return build_all_rows(data, asset_type_map)
+
+
+def build_all_rows(data, asset_type_map):
+    # type: (Iterable[Tuple], Dict[str, str]) -> MigrationPlan
+    """Extract unique subcommunities, buildings, spaces, assets, asset-space pairs,
+    data points, asset-points and asset-type-points in a single pass over the data.
+    
+    Args:
+        data: CSV records as tuples ordered like RECORD_FIELDS; consumed once,
+            so a streaming iterator (see read_multiple_csv_files) works
+        asset_type_map: Mapping from asset_type name to asset_type_id
+    """
+    # Rows keyed by their unique field; the first record seen for a key wins
+    # and dicts keep insertion order, so the output order follows the CSV
+    subcommunities = {}  # type: Dict[str, Tuple]
+    buildings = {}  # type: Dict[str, Tuple]
+    spaces = {}  # type: Dict[str, Tuple]
+    assets = {}  # type: Dict[str, Tuple]
+    asset_spaces = {}  # type: Dict[Tuple, None]
+    data_points = {}  # type: Dict[str, Tuple]
+    # Relationships are deduplicated on point_name, which maps 1:1 to data_point.id
+    asset_points = {}  # type: Dict[Tuple, Tuple]
+    asset_type_points = {}  # type: Dict[Tuple, Tuple]
+    # Raw asset_type value -> (stripped name, asset_type_id or None)
+    asset_types = {}  # type: Dict[Union[str, None], Tuple[str, Union[str, None]]]
+    skipped_space_count = 0
+
+    for (
+        sub_id, sub_community_location, sub_community_name,
+        sub_community_status, community_id, sub_community_domain, sub_community_type,
+        bldg_id, building_name, building_status, building_location,
+        building_site_code, building_open_time, building_close_time, building_domain,
+        building_type, building_created_by, building_created_on,
+        space_id, spaces_layout, spaces_name, spaces_status, spaces_domain, spaces_type,
+        asset_id, asset_code, cost_of_purchase, created_by, created_on, asset_name,
+        asset_make, asset_model, asset_status, asset_updated_by, asset_updated_on,
+        analytics_profile_id, asset_domain, asset_settings_id, active_contract, asset_type,
+        point_name, point_status, access_type, point_data_type, point_display_name,
+        remote_data_type, point_symbol, point_unit, point_expression, point_precedence,
+    ) in data:
+        # Few distinct asset types repeat across many records: resolve each raw value once
+        resolved_type = asset_types.get(asset_type)
+        if resolved_type is None:
+            stripped_name = (asset_type or "").strip()
+            resolved_type = asset_types[asset_type] = (stripped_name, asset_type_map.get(stripped_name))
+        asset_type_name, asset_type_id = resolved_type
+
+        # Subcommunities
+        if sub_id and sub_id not in subcommunities:
+            subcommunities[sub_id] = (
+                sub_id,
+                sub_community_location,
+                sub_community_name,
+                sub_community_status or _DEFAULT_STATUS,
+                community_id,
+                sub_community_domain,
+                sub_community_type
             )
-        )
-    return rows
-
 
-def get_asset_space_rows(data):
-    # type: (List[Dict]) -> List[Tuple]
-    """Extract unique asset-space relationships."""
-    seen = set()
-    rows = []
-    for record in data:
-        asset_id = record.get("asset_id")  # Use CSV asset_id (UUID) instead of asset_name
-        space_id = record.get("spaces_id")
-        
-        # Skip if asset_id or space_id is missing, None, or empty/whitespace
-        if not asset_id or not space_id:
-            continue
-        asset_id = str(asset_id).strip()
-        space_id = str(space_id).strip()
-        if not asset_id or not space_id:
-            continue
-        
-        # Create unique key for asset-space pair
-        pair_key = (asset_id, space_id)
-        if pair_key in seen:
-            continue
-        
-        seen.add(pair_key)
-        rows.append((asset_id, space_id))
-    
-    return rows
+        # Buildings
+        if bldg_id and bldg_id not in buildings:
+            buildings[bldg_id] = (
+                bldg_id,
+                building_name,
+                building_status or _DEFAULT_STATUS,
+                building_location,
+                building_site_code,
+                _ts(building_open_time),
+                _ts(building_close_time),
+                building_domain,
+                building_type,
+                building_created_by,
+                _ts(building_created_on),
+                sub_id
+            )
 
+        # Spaces
+        if not space_id:
+            skipped_space_count += 1
+        elif space_id != "null" and space_id not in spaces:
+            if not bldg_id:
+                logger.warning("Skipping space %s due to missing building_id", space_id)
+                skipped_space_count += 1
+            else:
+                spaces[space_id] = (
+                    space_id,
+                    spaces_layout,  # parsed in SQL, see _SQL_INT
+                    spaces_name,
+                    spaces_status or _DEFAULT_STATUS,
+                    bldg_id,
+                    spaces_domain,
+                    spaces_type,
+                )
 
-def get_data_point_rows(data):
-    # type: (List[Dict]) -> List[Tuple]
-    """Extract unique data points based on point_name (name field).
-    
-    Collects ALL points from all records and finds unique point names.
-    
-    Returns:
-        list: List of row_data tuples (without id, will be auto-generated)
-    """
-    seen = set()  # Track seen point_name values
-    rows = []
-    
-    for record in data:
-        point_name = record.get("point_name")
-        
-        # Skip if point_name is missing
-        if not point_name or not point_name.strip():
-            continue
-        
-        point_name = point_name.strip()
-        
-        # Skip if we've already seen this point_name (deduplicate by point_name)
-        if point_name in seen:
-            continue
-        
-        seen.add(point_name)
-        
-        # Row without id (will be auto-generated)
-        row_data = (
-            record.get("access_type"),
-            record.get("point_data_type"),
-            record.get("point_display_name"),
-            point_name,  # This is the unique field
-            record.get("remote_data_type"),
-            record.get("point_status") or "ACTIVE",
-            record.get("point_symbol"),
-            record.get("point_unit"),
-        )
-        
-        rows.append(row_data)
-    
-    return rows
+        # Assets
+        if asset_id and asset_id not in assets:
+            if asset_type_name and not asset_type_id:
+                logger.warning("Asset type '%s' not found in lookup table", asset_type_name)
+            assets[asset_id] = (
+                asset_id,
+                asset_code,
+                cost_of_purchase,  # parsed in SQL, see _SQL_FLOAT
+                created_by,
+                _ts(created_on),
+                asset_name,
+                asset_make,
+                asset_model,
+                asset_status or _DEFAULT_STATUS,
+                asset_updated_by,
+                _ts(asset_updated_on),
+                analytics_profile_id,
+                community_id,
+                asset_domain,
+                asset_settings_id,
+                bldg_id,
+                sub_id,
+                active_contract,
+                asset_type_id,
+            )
 
+        # Asset-space relationships
+        if asset_id and space_id:
+            pair_key = (str(asset_id).strip(), str(space_id).strip())
+            if pair_key[0] and pair_key[1]:
+                # Re-assigning an existing key keeps its original position
+                asset_spaces[pair_key] = None
 
-def get_asset_point_rows(data, point_name_to_data_point_id_map):
-    # type: (List[Dict], Dict[str, str]) -> List[Tuple]
-    """Extract asset-point relationships.
-    
-    For each asset, find all its points (by point_name) and create one row per asset-point combination.
-    One asset can have 5-10 points, so there will be multiple entries in asset_point table.
-    Multiple assets can have the same point_name (duplication allowed).
-    
-    Args:
-        data: CSV data
-        point_name_to_data_point_id_map: Mapping from point_name to data_point.id
-    """
-    seen = set()  # Deduplicate within this batch to avoid inserting same row multiple times from CSV
-    rows = []
-    for record in data:
-        asset_id = record.get("asset_id")
-        point_name = record.get("point_name")
-        
-        if not asset_id or not point_name:
-            continue
-        
-        point_name = point_name.strip()
+        # Data points and their asset / asset type relationships
+        if point_name:
+            point_name = point_name.strip()
         if not point_name:
             continue
-        
-        # Get the data_point.id from the mapping using point_name
-        data_point_id = point_name_to_data_point_id_map.get(point_name)
-        if not data_point_id:
-            logger.warning("Point name '%s' not found in data_point map for asset %s", point_name, asset_id)
-            continue  # Skip if data_point wasn't created
-        
-        # Deduplicate within this batch to avoid inserting same row multiple times from CSV
-        pair_key = (asset_id, data_point_id)
-        if pair_key in seen:
-            continue
-        
-        seen.add(pair_key)
-        
-        precedence_raw = record.get("point_precedence")
-        precedence = None
-        if precedence_raw and precedence_raw.strip():
-            try:
-                precedence = int(precedence_raw)
-            except (TypeError, ValueError):
-                precedence = None
-        
-        # Row without id (will be auto-generated)
-        # data_point_id is the id from data_point table
-        rows.append((
-            record.get("point_expression"),
-            precedence,
-            record.get("point_status") or "ACTIVE",
-            record.get("point_symbol"),
-            record.get("point_unit"),
-            asset_id,
-            data_point_id,  # Use data_point.id from the map
-        ))
-    return rows
 
+        if point_name not in data_points:
+            # Row without id (will be auto-generated)
+            data_points[point_name] = (
+                access_type,
+                point_data_type,
+                point_display_name,
+                point_name,  # This is the unique field
+                remote_data_type,
+                point_status or _DEFAULT_STATUS,
+                point_symbol,
+                point_unit,
+            )
 
-def get_asset_type_point_rows(data, asset_type_map, point_name_to_data_point_id_map):
-    # type: (List[Dict], Dict[str, str], Dict[str, str]) -> List[Tuple]
-    """Extract asset-type-point relationships.
-    
-    For each asset_type, find all its points (by point_name) and create one row per asset_type-point combination.
-    One asset_type can have multiple points, so there will be multiple entries in asset_type_point table.
-    Multiple asset types can have the same point_name (duplication allowed).
-    
-    Args:
-        data: CSV data
-        asset_type_map: Mapping from asset_type name to asset_type_id
-        point_name_to_data_point_id_map: Mapping from point_name to data_point.id
-    """
-    seen = set()  # Deduplicate within this batch to avoid inserting same row multiple times from CSV
-    rows = []
-    for record in data:
-        asset_type_name = (record.get("asset_type") or "").strip()
-        asset_type_id = asset_type_map.get(asset_type_name)
-        point_name = record.get("point_name")
-        
-        if not asset_type_id or not point_name:
-            continue
-        
-        point_name = point_name.strip()
-        if not point_name:
+        new_asset_point = bool(asset_id) and (asset_id, point_name) not in asset_points
+        new_asset_type_point = bool(asset_type_id) and (asset_type_id, point_name) not in asset_type_points
+        if not (new_asset_point or new_asset_type_point):
             continue
-        
-        # Get the data_point.id from the mapping using point_name
+
+        point_fields = (
+            point_expression,
+            point_precedence,  # parsed in SQL, see _SQL_INT
+            point_status or _DEFAULT_STATUS,
+            point_symbol,
+            point_unit,
+        )
+        if new_asset_point:
+            asset_points[(asset_id, point_name)] = point_fields + (asset_id, point_name)
+        if new_asset_type_point:
+            asset_type_points[(asset_type_id, point_name)] = point_fields + (asset_type_id, point_name)
+
+    if skipped_space_count > 0:
+        logger.info(f"Skipped {skipped_space_count} records with missing or empty space_id")
+
+    return MigrationPlan(
+        subcommunity_rows=list(subcommunities.values()),
+        building_rows=list(buildings.values()),
+        space_rows=list(spaces.values()),
+        asset_rows=list(assets.values()),
+        asset_space_rows=list(asset_spaces),
+        data_point_rows=list(data_points.values()),
+        asset_point_rows=list(asset_points.values()),
+        asset_type_point_rows=list(asset_type_points.values()),
+    )
+
+
+def resolve_point_rows(rows, point_name_to_data_point_id_map, owner_label):
+    # type: (List[Tuple], Dict[str, str], str) -> List[Tuple]
+    """Replace the trailing point_name of asset-point / asset-type-point rows with data_point.id.
+    
+    Rows whose point_name has no data_point are skipped.
+    """
+    resolved = []  # type: List[Tuple]
+    for row in rows:
+        point_name = row[-1]
         data_point_id = point_name_to_data_point_id_map.get(point_name)
         if not data_point_id:
-            logger.warning("Point name '%s' not found in data_point map for asset_type %s", point_name, asset_type_name)
+            logger.warning("Point name '%s' not found in data_point map for %s %s", point_name, owner_label, row[-2])
             continue  # Skip if data_point wasn't created
-        
-        # Deduplicate within this batch to avoid inserting same row multiple times from CSV
-        pair_key = (asset_type_id, data_point_id)
-        if pair_key in seen:
-            continue
-        
-        seen.add(pair_key)
-        
-        precedence_raw = record.get("point_precedence")
-        precedence = None
-        if precedence_raw and precedence_raw.strip():
-            try:
-                precedence = int(precedence_raw)
-            except (TypeError, ValueError):
-                precedence = None
-        
-        # Row without id (will be auto-generated)
-        # data_point_id is the id from data_point table
-        rows.append((
-            record.get("point_expression"),
-            precedence,
-            record.get("point_status") or "ACTIVE",
-            record.get("point_symbol"),
-            record.get("point_unit"),
-            asset_type_id,
-            data_point_id,  # Use data_point.id from the map
-        ))
-    return rows
+        resolved.append(row[:-1] + (data_point_id,))
+    return resolved
 
 
-def migrate_subcommunities(conn: _PGConnection, data):
-    # type: (_PGConnection, List[Dict]) -> None
+def migrate_subcommunities(conn: _PGConnection, rows):
+    # type: (_PGConnection, List[Tuple]) -> None
     """Migrate subcommunities to PostgreSQL."""
-    rows = get_subcommunity_rows(data)
     if not rows:
-        print("No subcommunities to migrate")
+        logger.info("No subcommunities to migrate")
         return
     
     logger.info(f"Found {len(rows)} subcommunities to process")
-    print(f"Processing {len(rows)} subcommunities...")
     
     # Filter out subcommunities where community_id doesn't exist in clients table
     # First, fetch all valid client_ids in a single query (much faster than individual queries)
@@ -550,96 +490,59 @@ def migrate_subcommunities(conn: _PGConnection, data):
         valid_rows.append(tuple(row_list))
     
     if not valid_rows:
-        print("No valid subcommunities to migrate (all subcommunities have invalid or missing community_id)")
+        logger.info("No valid subcommunities to migrate (all subcommunities have invalid or missing community_id)")
         if skipped_community_count > 0:
-            print(f"Skipped {skipped_community_count} subcommunities due to invalid/missing community_id")
+            logger.info("Skipped %s subcommunities due to invalid/missing community_id", skipped_community_count)
         return
     
     if skipped_community_count > 0:
         logger.info(f"Skipped {skipped_community_count} subcommunities due to invalid/missing community_id")
     
     logger.info(f"Inserting {len(valid_rows)} valid subcommunities into PostgreSQL...")
-    sql = """
-        INSERT INTO public.sub_community (
-            identifier, geo_location, name, status, community_id, domain, type
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (identifier) DO UPDATE SET
-            geo_location = EXCLUDED.geo_location,
-            name = EXCLUDED.name,
-            status = EXCLUDED.status,
-            community_id = EXCLUDED.community_id,
-            domain = EXCLUDED.domain,
-            type = EXCLUDED.type
-    """
-    batch_insert(conn, sql, valid_rows)
-    logger.info(f"Successfully inserted {len(valid_rows)} subcommunities")
-    print(f"✓ Migrated {len(valid_rows)} subcommunities")
+    columns = ("identifier", "geo_location", "name", "status", "community_id", "domain", "type")
+    copy_upsert(conn, "public.sub_community", columns, valid_rows, ("identifier",))
+    logger.info(f"✓ Migrated {len(valid_rows)} subcommunities")
 
 
-def migrate_buildings(conn: _PGConnection, data):
-    # type: (_PGConnection, List[Dict]) -> None
+def migrate_buildings(conn: _PGConnection, rows):
+    # type: (_PGConnection, List[Tuple]) -> None
     """Migrate buildings to PostgreSQL."""
-    rows = get_building_rows(data)
     if not rows:
-        print("No buildings to migrate")
+        logger.info("No buildings to migrate")
         return
     
-    sql = """
-        INSERT INTO public.building (
-            identifier, name, status, geo_location, site_code,
-            store_open_time, store_close_time, domain, type,
-            created_by, created_on, sub_community_id
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (identifier) DO UPDATE SET
-            name = EXCLUDED.name,
-            status = EXCLUDED.status,
-            geo_location = EXCLUDED.geo_location,
-            site_code = EXCLUDED.site_code,
-            store_open_time = EXCLUDED.store_open_time,
-            store_close_time = EXCLUDED.store_close_time,
-            domain = EXCLUDED.domain,
-            type = EXCLUDED.type,
-            created_by = EXCLUDED.created_by,
-            created_on = EXCLUDED.created_on,
-            sub_community_id = EXCLUDED.sub_community_id
-    """
-    batch_insert(conn, sql, rows)
-    print(f"✓ Migrated {len(rows)} buildings")
+    columns = (
+        "identifier", "name", "status", "geo_location", "site_code",
+        "store_open_time", "store_close_time", "domain", "type",
+        "created_by", "created_on", "sub_community_id",
+    )
+    copy_upsert(conn, "public.building", columns, rows, ("identifier",))
+    logger.info("✓ Migrated %s buildings", len(rows))
 
 
-def migrate_spaces(conn: _PGConnection, data):
-    # type: (_PGConnection, List[Dict]) -> None
+def migrate_spaces(conn: _PGConnection, rows):
+    # type: (_PGConnection, List[Tuple]) -> None
     """Migrate spaces to PostgreSQL."""
-    rows = get_space_rows(data)
-    print(rows) 
+    logger.debug("Space rows: %s", rows)
     if not rows:
-        print("No spaces to migrate")
+        logger.info("No spaces to migrate")
         return
 
-    sql = """
-        INSERT INTO public.space (
-            identifier, layout_hierarchy, name, status,
-            building_identifier, domain, type
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (identifier) DO UPDATE SET
-            layout_hierarchy = EXCLUDED.layout_hierarchy,
-            name = EXCLUDED.name,
-            status = EXCLUDED.status,
-            building_identifier = EXCLUDED.building_identifier,
-            domain = EXCLUDED.domain,
-            type = EXCLUDED.type
-    """
-    batch_insert(conn, sql, rows)
-    print(f"✓ Migrated {len(rows)} spaces")
+    columns = (
+        "identifier", "layout_hierarchy", "name", "status",
+        "building_identifier", "domain", "type",
+    )
+    copy_upsert(
+        conn, "public.space", columns, rows, ("identifier",),
+        conversions={"layout_hierarchy": "COALESCE({}, 0)".format(_SQL_INT.format("layout_hierarchy"))},
+    )
+    logger.info("✓ Migrated %s spaces", len(rows))
 
 
-def migrate_assets(conn: _PGConnection, data, asset_type_csv: Union[str, Path] = "assetType.csv"):
-    # type: (_PGConnection, List[Dict], Union[str, Path]) -> None
-    """Migrate assets to PostgreSQL."""
-    asset_type_map = load_asset_type_map(asset_type_csv)
-    rows = get_asset_rows(data, asset_type_map)
+def migrate_assets(conn: _PGConnection, rows, asset_space_rows):
+    # type: (_PGConnection, List[Tuple], List[Tuple]) -> None
+    """Migrate assets and asset-space relationships to PostgreSQL."""
     if not rows:
-        print("No assets to migrate")
         logger.warning("No asset rows found. Check if asset_id values exist in CSV.")
         return
 
@@ -647,42 +550,23 @@ def migrate_assets(conn: _PGConnection, data, asset_type_csv: Union[str, Path] =
     if rows:
         logger.debug(f"First asset identifier: {rows[0][0]}")
 
-    sql = """
-        INSERT INTO public.assets (
-            identifier, asset_code, cost_of_purchase, created_by, created_on,
-            display_name, make, model, status, updated_by, updated_on,
-            analytics_profile_id, client_id, colony, asset_settings_id, site_id,
-            sub_community_id, active_contract, type
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (identifier) DO UPDATE SET
-            asset_code = EXCLUDED.asset_code,
-            cost_of_purchase = EXCLUDED.cost_of_purchase,
-            created_by = EXCLUDED.created_by,
-            created_on = EXCLUDED.created_on,
-            display_name = EXCLUDED.display_name,
-            make = EXCLUDED.make,
-            model = EXCLUDED.model,
-            status = EXCLUDED.status,
-            updated_by = EXCLUDED.updated_by,
-            updated_on = EXCLUDED.updated_on,
-            analytics_profile_id = EXCLUDED.analytics_profile_id,
-            client_id = EXCLUDED.client_id,
-            colony = EXCLUDED.colony,
-            asset_settings_id = EXCLUDED.asset_settings_id,
-            site_id = EXCLUDED.site_id,
-            sub_community_id = EXCLUDED.sub_community_id,
-            active_contract = EXCLUDED.active_contract,
-            type = EXCLUDED.type
-    """
+    columns = (
+        "identifier", "asset_code", "cost_of_purchase", "created_by", "created_on",
+        "display_name", "make", "model", "status", "updated_by", "updated_on",
+        "analytics_profile_id", "client_id", "colony", "asset_settings_id", "site_id",
+        "sub_community_id", "active_contract", "type",
+    )
     try:
-        batch_insert(conn, sql, rows)
-        print(f"✓ Migrated {len(rows)} assets")
+        copy_upsert(
+            conn, "public.assets", columns, rows, ("identifier",),
+            conversions={"cost_of_purchase": _SQL_FLOAT.format("cost_of_purchase")},
+        )
+        logger.info("✓ Migrated %s assets", len(rows))
     except Exception as e:
         logger.error(f"Error inserting assets: {e}")
         raise
     
     # Migrate asset-space relationships
-    asset_space_rows = get_asset_space_rows(data)
     if asset_space_rows:
         # Filter out spaces that don't exist in the database
         # First, fetch all valid space identifiers in a single query (much faster than individual queries)
@@ -714,156 +598,174 @@ def migrate_assets(conn: _PGConnection, data, asset_type_csv: Union[str, Path] =
             asset_space_sql = """
                 INSERT INTO public.asset_spaces (
                     identifier, spaces_identifier
-                ) VALUES (%s, %s)
+                ) VALUES %s
                 ON CONFLICT DO NOTHING
             """
             batch_insert(conn, asset_space_sql, valid_asset_space_rows)
-            print(f"✓ Migrated {len(valid_asset_space_rows)} asset-space relationships")
+            logger.info("✓ Migrated %s asset-space relationships", len(valid_asset_space_rows))
         else:
-            print("No valid asset-space relationships to migrate (all spaces missing)")
+            logger.info("No valid asset-space relationships to migrate (all spaces missing)")
     else:
-        print("No asset-space relationships to migrate")
+        logger.info("No asset-space relationships to migrate")
 
 
-def migrate_points(conn: _PGConnection, data, asset_type_csv: Union[str, Path] = "assetType.csv"):
-    # type: (_PGConnection, List[Dict], Union[str, Path]) -> None
+def migrate_points(conn: _PGConnection, data_point_rows, asset_point_rows, asset_type_point_rows, connect=None):
+    # type: (_PGConnection, List[Tuple], List[Tuple], List[Tuple], Optional[ConnectionFactory]) -> None
     """Migrate points, asset-points, and asset-type-points to PostgreSQL.
     
     Order of operations:
-    1. First create data_point entries (auto-generate id and point_id)
-    2. Query back to get mapping from CSV data_point_id to auto-generated point_id
-    3. Use the point_id to create asset_point relationships (auto-generate id)
-    4. Use the point_id to create asset_type_point relationships (auto-generate id)
+    1. COPY the data_point entries into a staging table and insert the ones
+       whose name does not exist yet (auto-generate id and point_id)
+    2. Map every point name to its data_point id by joining the staging table
+    3. Use the data_point ids to bulk-insert asset_point relationships (auto-generate id)
+    4. Use the data_point ids to bulk-insert asset_type_point relationships (auto-generate id)
+    
+    When connect is given (e.g. ``lambda: pg_connection(cfg)``), steps 3 and 4
+    run in parallel, each on a connection opened from it.
     """
-    # Step 1: Get all unique data point rows based on point_name
-    data_point_rows = get_data_point_rows(data)
+    # Step 1: Insert the unique data point rows (deduplicated on point_name)
     if not data_point_rows:
-        print("No data points to migrate")
+        logger.info("No data points to migrate")
         return
     
-    print(f"Found {len(data_point_rows)} unique point names to insert into data_point table")
-    
-    # Insert data_points with auto-generated UUID
-    # Create mapping: point_name -> data_point.id
-    point_name_to_data_point_id_map = {}  # type: Dict[str, str]
-    inserted_count = 0
+    logger.info("Found %s unique point names to insert into data_point table", len(data_point_rows))
+    
+    # With a unique index on name, ON CONFLICT also covers concurrent inserts of the
+    # same point; without one, the NOT EXISTS check alone skips existing points
+    names_unique = has_unique_index(conn, "public.data_point", ("name",))
+    
+    # Stage the points with generated UUIDs, then let PostgreSQL insert the new
+    # ones (point_id is the same as id) and map every staged name to its id
+    # row_data structure: (access_type, data_type, display_name, name, remote_data_type, status, symbol, unit)
+    staged_rows = [
+        (data_point_id,) + row_data
+        for data_point_id, row_data in zip(bulk_uuids(len(data_point_rows)), data_point_rows)
+    ]
+    columns = ("id", "access_type", "data_type", "display_name", "name",
+               "remote_data_type", "status", "symbol", "unit")
     with conn.cursor() as cur:
-        for row_data in data_point_rows:
-            # Generate UUID for id and point_id (point_id will be same as id)
-            data_point_id = str(uuid.uuid4())
-            point_id = data_point_id  # point_id should be the same as id
-            
-            # Check if record already exists using name (point_name) - this should be unique
-            point_name = row_data[3]  # name is index 3
+        with staging_table(cur, "public.data_point", columns, staged_rows) as stage:
             cur.execute("""
-                SELECT id, point_id FROM public.data_point
-                WHERE name = %s
-                LIMIT 1
-            """, (point_name,))
-            existing_result = cur.fetchone()
+                INSERT INTO public.data_point (
+                    id, access_type, data_type, display_name, name,
+                    point_id, remote_data_type, status, symbol, unit
+                )
+                SELECT s.id, s.access_type, s.data_type, s.display_name, s.name,
+                       s.id, s.remote_data_type, s.status, s.symbol, s.unit
+                FROM {stage} s
+                WHERE NOT EXISTS (SELECT 1 FROM public.data_point dp WHERE dp.name = s.name)
+                {on_conflict}
+            """.format(stage=stage, on_conflict="ON CONFLICT (name) DO NOTHING" if names_unique else ""))
+            new_count = cur.rowcount
             
-            if existing_result:
-                # Row already exists, use existing IDs
-                db_id, existing_point_id = existing_result
-                point_id = existing_point_id if existing_point_id else db_id
-                point_name_to_data_point_id_map[point_name] = db_id
-                logger.debug("Data point with name '%s' already exists, using existing id: %s", point_name, db_id)
-            else:
-                # Insert new row with generated UUID
-                # row_data structure: (access_type, data_type, display_name, name, remote_data_type, status, symbol, unit)
-                # Cast UUID strings to UUID type for PostgreSQL
-                cur.execute("""
-                    INSERT INTO public.data_point (
-                        id, access_type, data_type, display_name, name,
-                        point_id, remote_data_type, status, symbol, unit
-                    ) VALUES (%s::uuid, %s, %s, %s, %s, %s::uuid, %s, %s, %s, %s)
-                    RETURNING id, point_id
-                """, (data_point_id, row_data[0], row_data[1], row_data[2], row_data[3], 
-                      point_id, row_data[4], row_data[5], row_data[6], row_data[7]))
-                
-                result = cur.fetchone()
-                if result:
-                    db_id, returned_point_id = result
-                    point_id = returned_point_id if returned_point_id else db_id
-                    point_name_to_data_point_id_map[point_name] = db_id
-                    inserted_count += 1
-                else:
-                    # If RETURNING didn't work, query again
-                    cur.execute("""
-                        SELECT id, point_id FROM public.data_point
-                        WHERE name = %s
-                        LIMIT 1
-                    """, (point_name,))
-                    result = cur.fetchone()
-                    if result:
-                        db_id, returned_point_id = result
-                        point_id = returned_point_id if returned_point_id else db_id
-                        point_name_to_data_point_id_map[point_name] = db_id
-                        inserted_count += 1
+            # Create mapping: point_name -> data_point.id, for new and existing points alike
+            cur.execute("""
+                SELECT dp.name, dp.id FROM {} s
+                JOIN public.data_point dp ON dp.name = s.name
+            """.format(stage))
+            point_name_to_data_point_id_map = dict(cur.fetchall())  # type: Dict[str, str]
+    existing_count = len(point_name_to_data_point_id_map) - new_count
     
     conn.commit()
-    print(f"✓ Migrated {len(point_name_to_data_point_id_map)} data points ({inserted_count} new, {len(point_name_to_data_point_id_map) - inserted_count} existing)")
+    logger.info(
+        "✓ Migrated %s data points (%s new, %s existing)",
+        len(point_name_to_data_point_id_map),
+        new_count,
+        existing_count,
+    )
     
     if not point_name_to_data_point_id_map:
         logger.error("No data_points were found after insertion. Cannot proceed with asset_point and asset_type_point.")
         return
     
-    print(f"✓ Created mapping for {len(point_name_to_data_point_id_map)} point names to data_point.id")
+    logger.info("✓ Created mapping for %s point names to data_point.id", len(point_name_to_data_point_id_map))
     
-    # Step 4: Migrate asset-point relationships (using auto-generated UUID for id)
-    # For each asset, find all its points (by point_name) and create one row per asset-point combination
+    # Steps 3-4: asset_point and asset_type_point only depend on the committed
+    # data_point ids, not on each other, so with a connection factory they are
+    # loaded concurrently, each on its own connection
     # One asset can have 5-10 points, so there will be multiple entries in asset_point table
-    asset_point_rows = get_asset_point_rows(data, point_name_to_data_point_id_map)
-    if asset_point_rows:
-        inserted_count = 0
-        with conn.cursor() as cur:
-            for row_data in asset_point_rows:
-                # Generate UUID for id
-                asset_point_id = str(uuid.uuid4())
-                # Just insert - allow multiple assets to have the same data_point_id
-                # Deduplication is handled in get_asset_point_rows for this batch
-                cur.execute("""
-                    INSERT INTO public.asset_point (
-                        id, expression, precedence, status, symbol, unit, asset_id, data_point_id
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT DO NOTHING
-                """, (asset_point_id, *row_data))
-                if cur.rowcount > 0:
-                    inserted_count += 1
-        conn.commit()
-        print(f"✓ Migrated {inserted_count} asset-point relationships")
+    link_steps = [
+        ("public.asset_point", "asset_id",
+         resolve_point_rows(asset_point_rows, point_name_to_data_point_id_map, "asset")),
+        ("public.asset_type_point", "asset_type_id",
+         resolve_point_rows(asset_type_point_rows, point_name_to_data_point_id_map, "asset_type")),
+    ]
+    if connect is None:
+        counts = [_insert_point_links(conn, *step) for step in link_steps]
     else:
-        print("No asset-point relationships to migrate")
-    
-    # Step 5: Migrate asset-type-point relationships (using auto-generated UUID for id)
-    # For each asset_type, find all its points (by point_name) and create one row per asset_type-point combination
-    # One asset_type can have multiple points, so there will be multiple entries in asset_type_point table
-    asset_type_map = load_asset_type_map(asset_type_csv)
-    asset_type_point_rows = get_asset_type_point_rows(data, asset_type_map, point_name_to_data_point_id_map)
-    if asset_type_point_rows:
-        inserted_count = 0
-        with conn.cursor() as cur:
-            for row_data in asset_type_point_rows:
-                # Generate UUID for id
-                asset_type_point_id = str(uuid.uuid4())
-                # Just insert - allow multiple asset types to have the same data_point_id
-                # Deduplication is handled in get_asset_type_point_rows for this batch
-                cur.execute("""
-                    INSERT INTO public.asset_type_point (
-                        id, expression, precedence, status, symbol, unit, asset_type_id, data_point_id
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT DO NOTHING
-                """, (asset_type_point_id, *row_data))
-                if cur.rowcount > 0:
-                    inserted_count += 1
-        conn.commit()
-        print(f"✓ Migrated {inserted_count} asset-type-point relationships")
-    else:
-        print("No asset-type-point relationships to migrate")
+        def insert_on_own_connection(step):
+            # type: (Tuple[str, str, List[Tuple]]) -> int
+            if not step[2]:
+                return 0
+            with connect() as worker_conn:
+                return _insert_point_links(worker_conn, *step)
+
+        with ThreadPoolExecutor(max_workers=len(link_steps)) as executor:
+            counts = list(executor.map(insert_on_own_connection, link_steps))
+
+    for label, (_, _, rows), count in zip(("asset-point", "asset-type-point"), link_steps, counts):
+        if rows:
+            logger.info("✓ Migrated %s %s relationships", count, label)
+        else:
+            logger.info("No %s relationships to migrate", label)
+
+
+def _insert_point_links(conn, table, owner_column, rows):
+    # type: (_PGConnection, str, str, List[Tuple]) -> int
+    """Insert resolved asset_point / asset_type_point rows with generated ids and commit.
+    
+    Rows are (expression, precedence, status, symbol, unit, owner_id, data_point_id),
+    with precedence still the raw CSV text; returns the number of rows actually inserted.
+    """
+    if not rows:
+        return 0
+    # Several owners may share a data_point_id, but each owner links a point
+    # once (duplicates within the batch were already dropped in build_all_rows);
+    # ON CONFLICT DO NOTHING skips rows rejected by the table's own constraints
+    rows = [(row_id,) + row_data for row_id, row_data in zip(bulk_uuids(len(rows)), rows)]
+    # For loads that are large relative to the table, secondary indexes are
+    # rebuilt once after the load instead of maintained per row
+    with deferred_secondary_indexes(conn, table, len(rows)):
+        inserted = insert_returning(conn, """
+            INSERT INTO {} (
+                id, expression, precedence, status, symbol, unit, {}, data_point_id
+            ) VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING id
+        """.format(table, owner_column), rows,
+            template="(%s, %s, {}, %s, %s, %s, %s, %s)".format(_SQL_INT.format("%s")))
+    conn.commit()
+    return len(inserted)
+
+
+# Migration steps in foreign key order, numbered like the menu choices 1-5
+_PLAN_STEPS = (
+    ("Subcommunities", lambda conn, plan, connect: migrate_subcommunities(conn, plan.subcommunity_rows)),
+    ("Buildings", lambda conn, plan, connect: migrate_buildings(conn, plan.building_rows)),
+    ("Spaces", lambda conn, plan, connect: migrate_spaces(conn, plan.space_rows)),
+    ("Assets", lambda conn, plan, connect: migrate_assets(conn, plan.asset_rows, plan.asset_space_rows)),
+    ("Points", lambda conn, plan, connect: migrate_points(
+        conn, plan.data_point_rows, plan.asset_point_rows, plan.asset_type_point_rows, connect
+    )),
+)
+
+
+def run_plan(conn, plan, first_step=1, connect=None, last_step=None):
+    # type: (_PGConnection, MigrationPlan, int, Optional[ConnectionFactory], Optional[int]) -> None
+    """Migrate the plan's entities for steps first_step to last_step (1 = Subcommunities).
+    
+    Only first_step runs unless last_step is given.
+    """
+    if last_step is None:
+        last_step = first_step
+    for label, run_step in _PLAN_STEPS[first_step - 1:last_step]:
+        logger.info("→ Migrating %s...", label)
+        run_step(conn, plan, connect)
 
 
 def show_menu() -> str:
     """Display migration menu and get user choice."""
+    flush_log_handlers()
     print("\n" + "="*50)
     print("DATA MIGRATION MENU")
     print("="*50)
@@ -873,40 +775,58 @@ def show_menu() -> str:
     print("4. Start from Asset")
     print("5. Start from Point")
     print("6. Exit")
+    print("7. Run all steps (Subcommunity → Point)")
     print("="*50)
     
+    prompt = "\nEnter your choice (1-7): "
+    interactive = sys.stdin.isatty()
     while True:
-        choice = input("\nEnter your choice (1-6): ").strip()
-        if choice in ['1', '2', '3', '4', '5', '6']:
+        if interactive:
+            choice = input(prompt).strip()
+        else:
+            # Scripted run (choice piped on stdin): skip input()'s prompt handling
+            line = sys.stdin.readline()
+            if not line:
+                raise EOFError("No menu choice provided on stdin")
+            choice = line.strip()
+        if choice in _MENU_CHOICES:
             return choice
-        print("Invalid choice. Please enter a number between 1 and 6.")
+        print("Invalid choice. Please enter a number between 1 and 7.")
 
 
-def run_migration(conn: _PGConnection, csv_file_path: Union[str, Path] = "data_*.csv", data_dir: Union[str, Path] = "data"):
-    # type: (_PGConnection, Union[str, Path], Union[str, Path]) -> None
+def run_migration(
+    conn: _PGConnection,
+    csv_file_path: Union[str, Path] = "data_*.csv",
+    data_dir: Union[str, Path] = "data",
+    asset_type_csv: Union[str, Path] = "assetType.csv",
+    connect: Optional[ConnectionFactory] = None,
+):
+    # type: (_PGConnection, Union[str, Path], Union[str, Path], Union[str, Path], Optional[ConnectionFactory]) -> None
     """Main migration function with menu-driven selection.
     
     This function:
-    1. Reads ALL CSV files from the data folder first
-    2. Combines all data from all files
-    3. Then processes unique data during migration (deduplication happens in get_*_rows functions)
+    1. Finds ALL CSV files in the data folder first
+    2. Streams the records of all files, in order, into build_all_rows
+    3. Which extracts the unique rows of every entity in one pass (MigrationPlan)
+    4. Then migrates the chosen step, or every step in order (run_plan)
     
     Args:
         conn: PostgreSQL connection
         csv_file_path: CSV file path or pattern (e.g., "data_*.csv" or "data_1.csv")
                       Default: "data_*.csv" - will find all data_*.csv files in the data folder
         data_dir: Directory containing CSV files (default: "data")
+        asset_type_csv: CSV with the asset type name → id lookup (default: "assetType.csv")
+        connect: Optional factory for extra connections; lets the point step load
+                 asset_point and asset_type_point in parallel (see migrate_points)
     """
     # Print database name
     with conn.cursor() as cur:
         cur.execute("SELECT current_database()")
         db_name = cur.fetchone()[0]
-        print(f"Database: {db_name}\n")
+        logger.info("Database: %s", db_name)
     
     try:
-        print("="*60)
-        print("CSV DATA LOADING")
-        print("="*60)
+        logger.info("CSV DATA LOADING")
         # Automatically detect and process multiple CSV files
         # If pattern contains wildcards, use it directly; otherwise look for numbered variants
         csv_path = Path(csv_file_path)
@@ -922,35 +842,27 @@ def run_migration(conn: _PGConnection, csv_file_path: Union[str, Path] = "data_*
             base_dir = csv_path.parent if csv_path.parent != Path('.') else Path(data_dir)
             pattern = csv_path.name
             data = read_multiple_csv_files(pattern, base_dir)
-        
-        print(f"\n{'='*60}")
-        print(f"STEP 2: Processing unique data from {len(data)} total records...")
-        print(f"{'='*60}\n")
     except Exception as e:
         logger.error(f"Failed to read CSV: {e}")
-        print(f"✗ Error: {e}")
         return
     
     choice = show_menu()
+    if choice == '6':
+        logger.info("✓ Exiting migration")
+        return
     
-    if choice == '1':
-        print("\n→ Migrating Subcommunities...")
-        migrate_subcommunities(conn, data)
-    elif choice == '2':
-        print("\n→ Migrating Buildings...")
-        migrate_buildings(conn, data)
-    elif choice == '3':
-        print("\n→ Migrating Spaces...")
-        migrate_spaces(conn, data)
-    elif choice == '4':
-        print("\n→ Migrating Assets...")
-        migrate_assets(conn, data)
-    elif choice == '5':
-        print("\n→ Migrating Points...")
-        migrate_points(conn, data)
-    elif choice == '6':
-        print("\n✓ Exiting migration")
+    # The files are read here, while the unique rows are extracted; only read
+    # failures are reported here, errors while building the rows fail the run
+    try:
+        plan = MigrationPlan.from_data(data, load_asset_type_map(asset_type_csv))
+    except (OSError, csv.Error, UnicodeDecodeError) as e:
+        logger.error(f"Failed to read CSV: {e}")
         return
     
-    print("\n✓ Migration completed")
+    if choice == _RUN_ALL_CHOICE:
+        run_plan(conn, plan, 1, connect, last_step=len(_PLAN_STEPS))
+    else:
+        run_plan(conn, plan, int(choice), connect)
+    
+    logger.info("✓ Migration completed")
 
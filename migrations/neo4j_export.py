@@ -1,18 +1,39 @@
 import csv
+import io
 import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Union
+from itertools import count
+from operator import itemgetter
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple, Union
 
 from neo4j import Session
 from psycopg2.extensions import connection as _PGConnection
 
-from db.neo4j_utils import run_query
+from db.neo4j_utils import run_query, stream_query
 
 logger = logging.getLogger(__name__)
 
-# Neo4j query templates (subcommunity_id will be injected)
-COUNT_QUERY_TEMPLATE = """
-MATCH (subCommunity:SubCommunity {{identifier:'{subcommunity_id}'}})-[:tags]->(building)
+# Number of subcommunities fetched per Neo4j round-trip
+SUBCOMMUNITY_GROUP_SIZE = 16
+
+# Number of subcommunity groups exported concurrently when a session factory is given
+EXPORT_WORKERS = 8
+
+# Export progress is logged every this many records of a group
+PROGRESS_LOG_INTERVAL = 10000
+
+# Opens a new Neo4j session (e.g. lambda: neo4j_session(driver))
+SessionFactory = Callable[[], ContextManager[Session]]
+
+# Neo4j queries over a group of subcommunities ($subcommunity_ids parameter)
+COUNT_QUERY = """
+UNWIND $subcommunity_ids AS subcommunity_id
+MATCH (subCommunity:SubCommunity {identifier: subcommunity_id})-[:tags]->(building)
       -[:equips]->(asset)-[:sharePoint]->(point:Point)
 OPTIONAL MATCH (asset)<-[:tags]-(spaces)
 WHERE subCommunity.status <> 'DELETED'
@@ -20,12 +41,14 @@ WHERE subCommunity.status <> 'DELETED'
   AND asset.status <> 'DELETED'
   AND point.status <> 'DELETED'
   AND (spaces IS NULL OR spaces.status <> 'DELETED')
-RETURN count(*) AS total_count
+RETURN subcommunity_id, count(*) AS total_count
 """
 
-# Neo4j query to fetch data (with SKIP and LIMIT placeholders)
-DATA_QUERY_TEMPLATE = """
-MATCH (subCommunity:SubCommunity {{identifier:'{subcommunity_id}'}})-[:tags]->(building)
+# Neo4j query to fetch data (streamed once per group, see iter_subcommunity_batches).
+# It has no ORDER BY, so Neo4j can stream rows without materializing and sorting them
+DATA_QUERY = """
+UNWIND $subcommunity_ids AS subcommunity_id
+MATCH (subCommunity:SubCommunity {identifier: subcommunity_id})-[:tags]->(building)
       -[:equips]->(asset)-[:sharePoint]->(point:Point)
 OPTIONAL MATCH (asset)<-[:tags]-(spaces)
 WHERE subCommunity.status <> 'DELETED'
@@ -83,11 +106,10 @@ RETURN
     point.expression         AS point_expression,
     point.precedence         AS point_precedence,
     point.type               AS point_type
-ORDER BY building_name, asset_name, point_name DESC
 """
 
 # CSV column order (matching the query return order)
-CSV_COLUMNS = [
+CSV_COLUMNS = (
     "asset_id",
     "asset_name",
     "asset_code",
@@ -137,7 +159,18 @@ CSV_COLUMNS = [
     "point_expression",
     "point_precedence",
     "point_type",
-]
+)
+
+
+# Picks a record's values in CSV_COLUMNS order. Every column is a RETURN alias
+# of DATA_QUERY, so each record has all of them
+_csv_row = itemgetter(*CSV_COLUMNS)
+
+# Subcommunity of a CSV row tuple
+_row_subcommunity_id = itemgetter(CSV_COLUMNS.index("sub_community_id"))
+
+# A record as a tuple of values in CSV_COLUMNS order
+CsvRow = Tuple[Any, ...]
 
 
 def read_subcommunity_ids(csv_file_path: Union[str, Path] = "subcommunityids.csv"):
@@ -167,55 +200,187 @@ def read_subcommunity_ids(csv_file_path: Union[str, Path] = "subcommunityids.csv
     return subcommunity_ids
 
 
-def get_total_count(session: Session, subcommunity_id: str):
-    # type: (Session, str) -> int
-    """Get the total count of records from Neo4j for a specific subcommunity."""
-    logger.info("Fetching total count from Neo4j for subcommunity: %s", subcommunity_id)
-    query = COUNT_QUERY_TEMPLATE.format(subcommunity_id=subcommunity_id)
-    result = run_query(session, query)
-    if not result:
-        logger.warning("No count result returned for subcommunity: %s", subcommunity_id)
-        return 0
+def get_total_counts(session: Session, subcommunity_ids: List[str]):
+    # type: (Session, List[str]) -> Dict[str, int]
+    """Get the record count of each subcommunity in a group with one Neo4j query.
+    
+    Subcommunities without records are missing from the result.
+    """
+    logger.info("Fetching total counts from Neo4j for %s subcommunities", len(subcommunity_ids))
+    result = run_query(session, COUNT_QUERY, {"subcommunity_ids": subcommunity_ids})
+    counts = {record["subcommunity_id"]: int(record["total_count"]) for record in result}
+    for subcommunity_id, total_count in counts.items():
+        logger.info("Total records for subcommunity %s: %s", subcommunity_id, total_count)
+    return counts
+
+
+def iter_subcommunity_batches(session: Session, subcommunity_ids: List[str], batch_size: int):
+    # type: (Session, List[str], int) -> Iterator[Tuple[str, List[CsvRow]]]
+    """Run the data query once for a group of subcommunities and yield
+    (subcommunity_id, rows) batches of at most batch_size CSV row tuples.
+    
+    Records stream from the driver as they are consumed, so the query is not
+    re-executed per batch (as SKIP/LIMIT paging would). Each record is turned
+    into a CSV row tuple as it arrives. The query is unordered, so rows are
+    bucketed per subcommunity client-side; at most one partial batch per
+    subcommunity of the group is held in memory.
+    """
+    records = stream_query(session, DATA_QUERY, {"subcommunity_ids": subcommunity_ids}, transform=_csv_row)
+    batches = {}  # type: Dict[str, List[CsvRow]]
+    for row in records:
+        subcommunity_id = _row_subcommunity_id(row)
+        batch = batches.setdefault(subcommunity_id, [])
+        batch.append(row)
+        if len(batch) >= batch_size:
+            del batches[subcommunity_id]
+            logger.debug("Fetched %s records for subcommunity %s", len(batch), subcommunity_id)
+            yield subcommunity_id, batch
+    
+    for subcommunity_id, batch in batches.items():
+        logger.debug("Fetched %s records for subcommunity %s", len(batch), subcommunity_id)
+        yield subcommunity_id, batch
+
+
+def format_csv_batch(records, write_header: bool = True):
+    # type: (List[CsvRow], bool) -> bytes
+    """Format CSV row tuples (and optionally the header) as one UTF-8 encoded chunk."""
+    buf = io.StringIO(newline='')
+    writer = csv.writer(buf)
+    if write_header:
+        writer.writerow(CSV_COLUMNS)
     
-    total_count = result[0].get("total_count", 0)
-    logger.info("Total records for subcommunity %s: %s", subcommunity_id, total_count)
-    return int(total_count)
+    # Rows are already in CSV_COLUMNS order; csv.writer writes None as ""
+    writer.writerows(records)
+    return buf.getvalue().encode('utf-8')
 
 
-def fetch_batch(session: Session, skip: int, limit: int, subcommunity_id: str):
-    # type: (Session, int, int, str) -> List[Dict[str, Any]]
-    """Fetch a batch of records from Neo4j for a specific subcommunity."""
-    query = DATA_QUERY_TEMPLATE.format(subcommunity_id=subcommunity_id) + f"\nSKIP {skip} LIMIT {limit}"
-    logger.debug("Fetching batch: skip=%s, limit=%s, subcommunity_id=%s", skip, limit, subcommunity_id)
-    records = run_query(session, query)
-    logger.info("Fetched %s records (skip=%s, limit=%s) for subcommunity %s", len(records), skip, limit, subcommunity_id)
-    return records
+def write_csv_chunk(chunk: bytes, file_path: Union[str, Path], write_header: bool = True):
+    # type: (bytes, Union[str, Path], bool) -> None
+    """Write a formatted chunk to a file, creating it if write_header is True and appending otherwise."""
+    with open(file_path, 'wb' if write_header else 'ab') as f:
+        f.write(chunk)
 
 
-def convert_value_to_string(value: Any) -> str:
-    """Convert a value to a string for CSV output, handling None."""
-    if value is None:
-        return ""
-    return str(value)
+def save_to_csv(records, file_path: Union[str, Path], write_header: bool = True):
+    # type: (List[CsvRow], Union[str, Path], bool) -> None
+    """Save CSV row tuples to a CSV file. If write_header is False, append without header.
+    
+    The batch is formatted in memory and written to the file with a single
+    encode and write, instead of going through the text layer row by row.
+    """
+    write_csv_chunk(format_csv_batch(records, write_header), file_path, write_header)
+    logger.info("✓ Saved %s records to %s", len(records), file_path)
+
+
+@contextmanager
+def background_csv_writer(max_pending: int = 2):
+    # type: (int) -> Iterator[Callable[..., None]]
+    """Yield a write_csv(records, file_path, write_header=True) function that
+    saves batches on a background thread.
+    
+    At most max_pending batches wait in the queue, so fetching from Neo4j
+    overlaps with writing without buffering the whole export. Batches are
+    written in the order they were queued, so appends to one file stay in
+    order. The first write error is re-raised by the next write_csv call, or
+    when the block exits.
+    """
+    pending = queue.Queue(maxsize=max_pending)  # type: queue.Queue
+    errors = []  # type: List[Exception]
+    
+    def write_loop():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            if errors:
+                continue  # Drain the queue without writing after a failure
+            records, file_path, write_header = item
+            try:
+                save_to_csv(records, file_path, write_header)
+            except Exception as e:
+                logger.error("Error writing %s: %s", file_path, str(e), exc_info=True)
+                errors.append(e)
+    
+    def write_csv(records, file_path, write_header=True):
+        if errors:
+            raise errors[0]
+        pending.put((records, file_path, write_header))
+    
+    writer = threading.Thread(target=write_loop, name="csv-writer", daemon=True)
+    writer.start()
+    try:
+        yield write_csv
+    finally:
+        pending.put(None)
+        writer.join()
+    if errors:
+        raise errors[0]
 
 
-def save_to_csv(records, file_path: Path, write_header: bool = True):
-    # type: (List[Dict[str, Any]], Path, bool) -> None
-    """Save records to a CSV file. If write_header is False, append without header."""
-    logger.info("Saving %s records to %s (header=%s)", len(records), file_path, write_header)
+def export_subcommunity_group(
+    session, group_ids, batch_size, out_dir, write_csv, file_numbers, show_progress=False, file_names=None
+):
+    # type: (Session, List[str], int, str, Callable[..., None], Iterator[int], bool, Optional[Dict[str, str]]) -> Dict[str, int]
+    """Export one group of subcommunities to CSV files in out_dir, one file per
+    subcommunity, numbered from file_numbers.
+    
+    With show_progress, the records of each subcommunity are counted first
+    (a second scan of the same pattern) so totals can be reported up front.
+    
+    file_names maps subcommunities to the files they were given and is filled
+    in as files are started; pass the same dict when retrying, so a retried
+    subcommunity overwrites its earlier partial file instead of getting a new one.
+    
+    Returns the records exported per subcommunity.
+    """
+    # Total counts for this group of subcommunities, only needed to report totals
+    counts = get_total_counts(session, group_ids) if show_progress else {}  # type: Dict[str, int]
+    
+    # Export in batches, split client-side from a single streamed query
+    subcommunity_exported = {}  # type: Dict[str, int]
+    if file_names is None:
+        file_names = {}
+    group_exported = 0
     
-    mode = 'w' if write_header else 'a'
-    with open(file_path, mode, newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
-        if write_header:
-            writer.writeheader()
+    for subcommunity_id, records in iter_subcommunity_batches(session, group_ids, batch_size):
+        first_batch = subcommunity_id not in subcommunity_exported
+        if first_batch:
+            subcommunity_exported[subcommunity_id] = 0
+            # One CSV file per subcommunity (data_1.csv, data_2.csv, etc.)
+            if subcommunity_id not in file_names:
+                file_names[subcommunity_id] = f"data_{next(file_numbers)}.csv"
+            if show_progress:
+                total_count = counts.get(subcommunity_id, 0)
+                logger.info(
+                    "Subcommunity %s: %s records, %s batches -> %s", subcommunity_id, total_count,
+                    (total_count + batch_size - 1) // batch_size, file_names[subcommunity_id],
+                )
+            else:
+                logger.info("Subcommunity %s -> %s", subcommunity_id, file_names[subcommunity_id])
         
-        for record in records:
-            # Ensure all columns are present, using empty string for missing values
-            row = {col: convert_value_to_string(record.get(col, "")) for col in CSV_COLUMNS}
-            writer.writerow(row)
+        file_name = file_names[subcommunity_id]
+        try:
+            # The first batch creates the file with a header, later batches append to it
+            write_csv(records, os.path.join(out_dir, file_name), write_header=first_batch)
+            
+            subcommunity_exported[subcommunity_id] += len(records)
+            
+        except Exception as e:
+            logger.error("Error processing batch for subcommunity %s: %s", subcommunity_id, str(e), exc_info=True)
+            raise
+        
+        previous_exported = group_exported
+        group_exported += len(records)
+        if group_exported // PROGRESS_LOG_INTERVAL > previous_exported // PROGRESS_LOG_INTERVAL:
+            logger.info("Processed %s records so far for subcommunities %s", group_exported, ", ".join(group_ids))
     
-    logger.info("✓ Saved %s records to %s", len(records), file_path)
+    for subcommunity_id in group_ids:
+        if subcommunity_id not in subcommunity_exported:
+            logger.warning("No records found for subcommunity: %s", subcommunity_id)
+    
+    for subcommunity_id, exported in subcommunity_exported.items():
+        logger.info("✓ Subcommunity %s completed: %s records exported", subcommunity_id, exported)
+    return subcommunity_exported
 
 
 def export_neo4j_to_csv(
@@ -224,8 +389,10 @@ def export_neo4j_to_csv(
     data_dir: Union[str, Path] = "data",
     batch_size: int = 5000,
     subcommunity_csv: Union[str, Path] = "subcommunityids.csv",
+    open_session: Optional[SessionFactory] = None,
+    show_progress: bool = False,
 ) -> None:
-    """Export data from Neo4j to CSV files in batches for each subcommunity.
+    """Export data from Neo4j to one CSV file per subcommunity, fetched and written in batches.
     
     Args:
         session: Neo4j session
@@ -233,109 +400,100 @@ def export_neo4j_to_csv(
         data_dir: Directory to save CSV files (default: "data")
         batch_size: Number of records per batch (default: 5000)
         subcommunity_csv: Path to CSV file containing subcommunity IDs (default: "subcommunityids.csv")
+        open_session: Optional factory for extra Neo4j sessions; when given, subcommunity
+            groups are exported concurrently, each on its own session
+        show_progress: Count each subcommunity's records before exporting it, to report
+            totals up front; costs a second scan of the graph (default: False)
     """
-    logger.info("Starting Neo4j to CSV export with batch_size: %s", batch_size)
-    print("\n" + "="*60)
-    print("NEO4J TO CSV EXPORT")
-    print("="*60)
-    print(f"Batch size: {batch_size}")
-    print(f"Subcommunity CSV: {subcommunity_csv}")
+    logger.info("Starting Neo4j to CSV export with batch_size: %s, subcommunities from %s", batch_size, subcommunity_csv)
     
     # Read subcommunity IDs from CSV
     try:
         subcommunity_ids = read_subcommunity_ids(subcommunity_csv)
     except FileNotFoundError as e:
         logger.error("Failed to read subcommunity CSV: %s", str(e))
-        print(f"✗ Error: {e}")
         raise
     
     if not subcommunity_ids:
         logger.warning("No subcommunity IDs found in CSV file")
-        print("✗ No subcommunity IDs found in CSV file")
         return
     
-    print(f"\nFound {len(subcommunity_ids)} subcommunity IDs to process\n")
-    
     # Ensure data directory exists
     data_path = Path(data_dir)
     data_path.mkdir(parents=True, exist_ok=True)
     logger.info("Output directory: %s", data_path.absolute())
+    out_dir = str(data_path)  # Joined with each file name in the batch loop
     
     # Track totals across all subcommunities
     total_exported = 0
     total_subcommunities = len(subcommunity_ids)
     processed_subcommunities = 0
-    global_batch_counter = 0  # Global counter for file naming across all subcommunities
+    file_numbers = count(1)  # Shared file numbering (data_1.csv, data_2.csv, ...) across workers
     
-    # Process each subcommunity
-    for subcommunity_idx, subcommunity_id in enumerate(subcommunity_ids, 1):
-        print(f"\n{'='*60}")
-        print(f"Processing Subcommunity {subcommunity_idx}/{total_subcommunities}: {subcommunity_id}")
-        print(f"{'='*60}")
+    group_starts = range(0, total_subcommunities, SUBCOMMUNITY_GROUP_SIZE)
+    groups = [
+        subcommunity_ids[group_start:group_start + SUBCOMMUNITY_GROUP_SIZE]
+        for group_start in group_starts
+    ]
+    
+    # Process the subcommunities in groups, one count and one data query per group;
+    # CSV files are written by a background thread while batches stream from Neo4j
+    with background_csv_writer(max_pending=EXPORT_WORKERS) as write_csv:
+        def export_ids(subcommunity_ids, file_names):
+            # type: (List[str], Dict[str, str]) -> Dict[str, int]
+            if open_session is None:
+                return export_subcommunity_group(
+                    session, subcommunity_ids, batch_size, out_dir, write_csv, file_numbers, show_progress, file_names
+                )
+            with open_session() as group_session:
+                return export_subcommunity_group(
+                    group_session, subcommunity_ids, batch_size, out_dir, write_csv, file_numbers, show_progress,
+                    file_names,
+                )
         
-        try:
-            # Get total count for this subcommunity
-            total_count = get_total_count(session, subcommunity_id)
-            
-            if total_count == 0:
-                logger.warning("No records found for subcommunity: %s", subcommunity_id)
-                print(f"  → No records found for this subcommunity")
-                continue
-            
-            print(f"  Total records: {total_count}")
-            
-            # Calculate number of batches for this subcommunity
-            num_batches = (total_count + batch_size - 1) // batch_size
-            print(f"  Number of batches: {num_batches}\n")
-            
-            # Export in batches
-            subcommunity_exported = 0
+        def export_group(group_start, group_ids):
+            # type: (int, List[str]) -> Dict[str, int]
+            logger.info(
+                "Processing subcommunities %s-%s/%s",
+                group_start + 1, group_start + len(group_ids), total_subcommunities,
+            )
+            file_names = {}  # type: Dict[str, str]
+            try:
+                return export_ids(group_ids, file_names)
+            except Exception as e:
+                if len(group_ids) == 1:
+                    logger.error("Error processing subcommunity %s: %s", group_ids[0], str(e), exc_info=True)
+                    return {}
+                logger.warning(
+                    "Error processing subcommunities %s: %s; retrying them one at a time",
+                    ", ".join(group_ids), str(e),
+                )
             
-            for batch_num in range(1, num_batches + 1):
-                skip = (batch_num - 1) * batch_size
-                limit = batch_size
-                global_batch_counter += 1
-                
-                print(f"  Batch {batch_num}/{num_batches} (skip={skip}, limit={limit})...", end=" ")
-                
+            # One failing subcommunity must not cost the others in its group their export,
+            # so each is retried on its own, rewriting any file the failed attempt started
+            group_exported = {}  # type: Dict[str, int]
+            for subcommunity_id in group_ids:
                 try:
-                    # Fetch batch from Neo4j
-                    records = fetch_batch(session, skip, limit, subcommunity_id)
-                    
-                    if not records:
-                        logger.warning("No records returned for batch %s of subcommunity %s", batch_num, subcommunity_id)
-                        print("No records")
-                        break
-                    
-                    # Save to separate CSV file (data_1.csv, data_2.csv, etc.)
-                    csv_file = data_path / f"data_{global_batch_counter}.csv"
-                    save_to_csv(records, csv_file, write_header=True)
-                    
-                    subcommunity_exported += len(records)
-                    total_exported += len(records)
-                    print(f"✓ {len(records)} records → {csv_file.name}")
-                    
+                    group_exported.update(export_ids([subcommunity_id], file_names))
                 except Exception as e:
-                    logger.error("Error processing batch %s for subcommunity %s: %s", batch_num, subcommunity_id, str(e), exc_info=True)
-                    print(f"✗ Error: {e}")
-                    raise
-            
-            processed_subcommunities += 1
-            print(f"\n  ✓ Subcommunity completed: {subcommunity_exported} records exported")
-            
-        except Exception as e:
-            logger.error("Error processing subcommunity %s: %s", subcommunity_id, str(e), exc_info=True)
-            print(f"\n  ✗ Error processing subcommunity: {e}")
-            # Continue with next subcommunity instead of failing completely
-            continue
+                    logger.error("Error processing subcommunity %s: %s", subcommunity_id, str(e), exc_info=True)
+                    # Continue with the other subcommunities instead of failing completely
+            return group_exported
+        
+        if open_session is None:
+            results = list(map(export_group, group_starts, groups))
+        else:
+            # Sessions are not thread-safe, so each group gets its own from the driver
+            with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as executor:
+                results = list(executor.map(export_group, group_starts, groups))
     
-    print("\n" + "="*60)
-    print(f"✓ Export completed successfully!")
-    print(f"  Subcommunities processed: {processed_subcommunities}/{total_subcommunities}")
-    print(f"  Total records exported: {total_exported}")
-    print(f"  Total files created: {global_batch_counter}")
-    print(f"  Output directory: {data_path.absolute()}")
-    print("="*60 + "\n")
+    # Every exported subcommunity has its own file
+    for subcommunity_exported in results:
+        processed_subcommunities += len(subcommunity_exported)
+        total_exported += sum(subcommunity_exported.values())
     
-    logger.info("Neo4j to CSV export completed. Exported %s records from %s subcommunities to %s files", total_exported, processed_subcommunities, global_batch_counter)
+    logger.info(
+        "Neo4j to CSV export completed. Exported %s records from %s/%s subcommunities, one file each in %s",
+        total_exported, processed_subcommunities, total_subcommunities, data_path.absolute(),
+    )
 
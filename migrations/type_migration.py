@@ -1,16 +1,41 @@
 import csv
 import logging
+import os
+import queue
+import threading
+from itertools import chain, islice
+from operator import itemgetter
 from pathlib import Path
-from typing import Any, Dict, List, Sequence, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 from neo4j import Session
 from psycopg2.extensions import connection as _PGConnection
 
-from db.postgres_utils import batch_insert
-from db.neo4j_utils import run_query
+from db.postgres_utils import copy_upsert, unique_rows
+from db.neo4j_utils import execute_read, stream_query
+from app_config.utils import clean_csv_value
 
 logger = logging.getLogger(__name__)
 
+# Parent/child Template pairs. A parent qualifies when some Template extends into it;
+# checking that one edge replaces enumerating every ancestor path, and DISTINCT drops
+# repeated pairs
+TYPE_HIERARCHY_QUERY = """
+    MATCH (parent:Template)-[:extends]->(child:Template)
+    WHERE (:Template)-[:extends]->(parent)
+    RETURN DISTINCT parent.name AS parent_name, 
+           child.name AS child_name, 
+           child.templateName AS child_template_name, 
+           child.displayName AS child_displayName
+"""
+
+# Rows per upsert in migrate_types_direct, and how many batches may wait for PostgreSQL
+DIRECT_LOAD_BATCH_SIZE = 1000
+DIRECT_LOAD_MAX_PENDING = 8
+
+# File buffer for the type CSV, so it is read and written in large blocks
+_CSV_BUFFER_SIZE = 1 << 20
+
 
 def export_types_from_neo4j(session: Session, csv_file_path: Union[str, Path] = "typeToMigrate.csv"):
     """Fetch type data from Neo4j and save to CSV file.
@@ -21,137 +46,166 @@ def export_types_from_neo4j(session: Session, csv_file_path: Union[str, Path] =
     """
     logger.info("Fetching type data from Neo4j")
     
-    cypher = """
-        MATCH (n:Template)-[:extends*]->(parent:Template)-[:extends]->(child:Template)
-        RETURN parent.name AS parent_name, 
-               child.name AS child_name, 
-               child.templateName AS child_template_name, 
-               child.displayName AS child_displayName
-    """
+    # Define fieldnames based on the query
+    fieldnames = ("parent_name", "child_name", "child_template_name", "child_displayName")
+    
+    csv_path = Path(csv_file_path)
+    tmp_path = csv_path.with_name(csv_path.name + ".tmp")
+    
+    def write_type_csv(tx):
+        # type: (Any) -> int
+        # Rows stream from the driver as tuples in fieldnames order and are written as they arrive.
+        # They go to a temporary file that only replaces csv_path once complete, so a failed
+        # attempt never leaves a partial CSV that a later run would take as already exported
+        records = stream_query(tx, TYPE_HIERARCHY_QUERY, transform=itemgetter(*fieldnames))
+        first_record = next(records, None)
+        if first_record is None:
+            return 0
+        
+        logger.info("Saving type records to %s", csv_path)
+        record_count = 0
+        try:
+            with open(tmp_path, 'w', newline='', encoding='utf-8', buffering=_CSV_BUFFER_SIZE) as csvfile:
+                writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+                writer.writerow(fieldnames)
+                
+                # csv.writer writes None values as empty strings
+                for record_count, record in enumerate(chain((first_record,), records), 1):
+                    writer.writerow(record)
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+        os.replace(str(tmp_path), str(csv_path))
+        return record_count
     
     try:
-        records = run_query(session, cypher)
+        # The whole export runs in one managed read transaction
+        record_count = execute_read(session, write_type_csv)
         
-        if not records:
+        if not record_count:
             logger.warning("No type data found in Neo4j")
-            print("No type data found in Neo4j")
             return
         
-        csv_path = Path(csv_file_path)
-        logger.info("Saving %s type records to %s", len(records), csv_path)
-        
-        # Define fieldnames based on the query
-        fieldnames = ["parent_name", "child_name", "child_template_name", "child_displayName"]
-        
-        with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_MINIMAL)
-            writer.writeheader()
-            
-            for record in records:
-                # Convert None values to empty strings for CSV
-                row = {k: (v if v is not None else '') for k, v in record.items()}
-                writer.writerow(row)
-        
-        logger.info("Successfully saved %s type records to %s", len(records), csv_path)
-        print(f"✓ Exported {len(records)} type records to {csv_path}")
+        logger.info("Successfully saved %s type records to %s", record_count, csv_path)
         
     except Exception as e:
         logger.error("Failed to export types from Neo4j: %s", str(e), exc_info=True)
-        print(f"✗ Failed to export types from Neo4j: {e}")
         raise
 
 
-def read_type_csv(csv_file_path: Union[str, Path] = "typeToMigrate.csv"):
-    # type: (Union[str, Path]) -> List[Dict]
-    """Read data from typeToMigrate.csv file."""
-    csv_path = Path(csv_file_path)
-    if not csv_path.exists():
-        raise FileNotFoundError(f"CSV file not found: {csv_path}")
-    
-    with open(csv_path, 'r', encoding='utf-8-sig') as f:  # utf-8-sig handles BOM
-        reader = csv.DictReader(f)
-        rows = []
-        for row in reader:
-            # Clean up keys (remove BOM if present) and strip quotes/whitespace
-            cleaned_row = {}
-            for k, v in row.items():
-                clean_key = k.lstrip('\ufeff')
-                if v is None:
-                    cleaned_row[clean_key] = None
-                elif isinstance(v, str):
-                    # Strip quotes from beginning and end, then strip whitespace
-                    v = v.strip().strip('"').strip("'").strip()
-                    cleaned_row[clean_key] = v if v else None
-                else:
-                    cleaned_row[clean_key] = v
-            rows.append(cleaned_row)
-        return rows
-
-
-def map_types_to_rows(type_data):
-    # type: (List[Dict]) -> Sequence[Tuple]
-    """Map CSV data to database rows for types table.
+def iter_type_rows(csv_file_path: Union[str, Path] = "typeToMigrate.csv"):
+    # type: (Union[str, Path]) -> Iterator[Tuple]
+    """Read typeToMigrate.csv and yield rows for the types table in one pass.
     
     Maps:
     - child_name -> name
     - parent_name -> parent_name
     - child_template_name -> template_name
     - status -> "ACTIVE" (default)
+    
+    Values are cleaned as they are read; records without child_name are skipped.
     """
-    logger.info("Mapping types to database rows")
-    rows = []  # type: List[Tuple]
-    skipped_count = 0
+    csv_path = Path(csv_file_path)
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV file not found: {csv_path}")
     
-    for record in type_data:
-        try:
-            name = record.get("child_name")
-            parent_name = record.get("parent_name")
-            template_name = record.get("child_template_name")
+    logger.info("Reading types from %s", csv_path)
+    skipped_count = 0
+    # utf-8-sig handles BOM
+    with open(csv_path, 'r', newline='', encoding='utf-8-sig', buffering=_CSV_BUFFER_SIZE) as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        positions = {column: index for index, column in enumerate(header)}
+        indices = [positions.get(column) for column in ("child_name", "parent_name", "child_template_name")]
+        
+        for row in reader:
+            if not row:
+                continue  # Blank line
+            name, parent_name, template_name = (
+                clean_csv_value(row[index]) if index is not None and index < len(row) else None
+                for index in indices
+            )
             
             # Skip if name is missing or empty (required field)
             if not name:
-                logger.warning("Skipping record with missing child_name: %s", record)
-                skipped_count += 1
-                continue
-            
-            # Ensure values are cleaned (strip quotes and whitespace, convert empty to None)
-            def clean_value(value):
-                if value is None:
-                    return None
-                if isinstance(value, str):
-                    value = value.strip().strip('"').strip("'").strip()
-                    return value if value else None
-                return value
-            
-            name = clean_value(name)
-            parent_name = clean_value(parent_name)
-            template_name = clean_value(template_name)
-            
-            # Skip if name is empty after cleaning
-            if not name:
-                logger.warning("Skipping record with empty child_name after cleaning: %s", record)
+                logger.warning("Skipping record with missing child_name: %s", row)
                 skipped_count += 1
                 continue
             
             # parent_name and template_name can be None
-            rows.append(
-                (
-                    name,  # name
-                    parent_name,  # parent_name (None if empty)
-                    "ACTIVE",  # status (default)
-                    template_name,  # template_name (None if empty)
-                )
+            yield (
+                name,  # name
+                parent_name,  # parent_name (None if empty)
+                "ACTIVE",  # status (default)
+                template_name,  # template_name (None if empty)
             )
-        except Exception as e:
-            logger.error("Error mapping type record %s: %s", record.get("child_name", "unknown"), str(e))
+    
+    if skipped_count > 0:
+        logger.warning("Skipped %s invalid type records during mapping", skipped_count)
+
+
+def iter_neo4j_type_rows(session: Session):
+    # type: (Session) -> Iterator[Tuple]
+    """Stream rows for the types table straight from Neo4j, without a CSV file.
+    
+    Values get the same mapping and cleaning as iter_type_rows; records
+    without child_name are skipped.
+    """
+    logger.info("Fetching type data from Neo4j")
+    records = stream_query(
+        session,
+        TYPE_HIERARCHY_QUERY,
+        transform=itemgetter("child_name", "parent_name", "child_template_name"),
+    )
+    skipped_count = 0
+    for values in records:
+        name, parent_name, template_name = map(clean_csv_value, values)
+        
+        # Skip if name is missing or empty (required field)
+        if not name:
+            logger.warning("Skipping record with missing child_name: %s", values)
             skipped_count += 1
             continue
+        
+        # parent_name and template_name can be None
+        yield (name, parent_name, "ACTIVE", template_name)
     
     if skipped_count > 0:
         logger.warning("Skipped %s invalid type records during mapping", skipped_count)
+
+
+def upsert_types(conn: _PGConnection, rows: Sequence[Tuple]):
+    # type: (_PGConnection, Sequence[Tuple]) -> None
+    """COPY rows, unique on name, into a staging table and upsert them on name in one statement."""
+    copy_upsert(
+        conn,
+        "public.types",
+        ("name", "parent_name", "status", "template_name"),
+        rows,
+        ("name",),
+        skip_unchanged=True,
+    )
+
+
+def load_types(conn: _PGConnection, type_rows: Iterable[Tuple]):
+    # type: (_PGConnection, Iterable[Tuple]) -> int
+    """Upsert type rows into public.types; returns the number of distinct types loaded."""
+    # One row per type name (last wins): a single upsert cannot update a row twice,
+    # and a child that extends several parents appears once per parent
+    type_rows = list(type_rows)
+    rows = unique_rows(type_rows)
+    if len(rows) < len(type_rows):
+        logger.info("Collapsed %s duplicate type rows", len(type_rows) - len(rows))
+    if not rows:
+        logger.info("No types found to migrate")
+        return 0
     
-    logger.info("Mapped %s types to rows", len(rows))
-    return rows
+    logger.info("Preparing to insert %s type rows into PostgreSQL", len(rows))
+    
+    upsert_types(conn, rows)
+    logger.info("Type migration completed successfully. Migrated %s rows", len(rows))
+    return len(rows)
 
 
 def migrate_types(session: Session, conn: _PGConnection, csv_file_path: Union[str, Path] = "typeToMigrate.csv"):
@@ -170,39 +224,74 @@ def migrate_types(session: Session, conn: _PGConnection, csv_file_path: Union[st
     csv_path = Path(csv_file_path)
     if not csv_path.exists():
         logger.info("CSV file not found at %s, fetching from Neo4j...", csv_path)
-        print(f"CSV file not found. Fetching type data from Neo4j...")
         export_types_from_neo4j(session, csv_file_path)
     
     try:
-        type_data = read_type_csv(csv_file_path)
-        rows = map_types_to_rows(type_data)
-        if not rows:
+        load_types(conn, iter_type_rows(csv_file_path))
+    except Exception as e:
+        logger.error("Type migration failed: %s", str(e), exc_info=True)
+        raise
+
+
+def migrate_types_direct(session: Session, conn: _PGConnection):
+    """Migrate types from Neo4j straight into PostgreSQL, skipping typeToMigrate.csv.
+    
+    Args:
+        session: Neo4j session
+        conn: PostgreSQL connection
+    """
+    logger.info("Starting direct type migration")
+    batches = queue.Queue(maxsize=DIRECT_LOAD_MAX_PENDING)  # type: queue.Queue
+    stop = threading.Event()
+    errors = []  # type: List[Exception]
+    
+    def read_batches():
+        # Producer: stream cleaned rows from Neo4j and queue them in batches
+        try:
+            rows = iter_neo4j_type_rows(session)
+            while not stop.is_set():
+                batch = list(islice(rows, DIRECT_LOAD_BATCH_SIZE))
+                if not batch:
+                    break
+                batches.put(batch)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            batches.put(None)
+    
+    reader = threading.Thread(target=read_batches, name="type-reader", daemon=True)
+    reader.start()
+    reader_done = False
+    try:
+        # Consumer: load each batch while the reader fetches the next ones. Batches are
+        # applied in order, so across batches the last row for a name still wins; a name
+        # already loaded with the same values is not upserted again
+        loaded = {}  # type: Dict[str, Tuple]
+        row_count = 0
+        while True:
+            batch = batches.get()
+            if batch is None:
+                reader_done = True
+                break
+            row_count += len(batch)
+            changed_rows = [row for row in unique_rows(batch) if loaded.get(row[0]) != row]
+            if changed_rows:
+                upsert_types(conn, changed_rows)
+                loaded.update((row[0], row) for row in changed_rows)
+        if errors:
+            raise errors[0]
+        
+        if row_count > len(loaded):
+            logger.info("Collapsed %s duplicate type rows", row_count - len(loaded))
+        if not loaded:
             logger.info("No types found to migrate")
-            print("No types to migrate")
             return
-        
-        logger.info("Preparing to insert %s type rows into PostgreSQL", len(rows))
-        print(f"Preparing to insert {len(rows)} types...")
-        
-        insert_sql = """
-            INSERT INTO public.types (
-                name,
-                parent_name,
-                status,
-                template_name
-            )
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (name) DO UPDATE SET
-                parent_name = EXCLUDED.parent_name,
-                status = EXCLUDED.status,
-                template_name = EXCLUDED.template_name
-        """
-
-        batch_insert(conn, insert_sql, rows)
-        logger.info("Type migration completed successfully. Migrated %s rows", len(rows))
-        print(f"✓ Migrated {len(rows)} types")
+        logger.info("Type migration completed successfully. Migrated %s rows", len(loaded))
     except Exception as e:
+        # Let the reader finish, unblocking it if it waits on a full queue
+        stop.set()
+        while not reader_done:
+            reader_done = batches.get() is None
+        reader.join()
         logger.error("Type migration failed: %s", str(e), exc_info=True)
-        print(f"✗ Type migration failed: {e}")
         raise
-
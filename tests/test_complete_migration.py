@@ -0,0 +1,94 @@
+import unittest
+
+from migrations.complete_migration import RECORD_FIELDS, build_all_rows, resolve_point_rows
+
+
+def _record(**fields):
+    """A CSV record tuple ordered like RECORD_FIELDS; unspecified fields are None."""
+    unknown = set(fields) - set(RECORD_FIELDS)
+    if unknown:
+        raise KeyError(unknown)
+    return tuple(fields.get(field) for field in RECORD_FIELDS)
+
+
+class BuildAllRowsPointDedupTest(unittest.TestCase):
+    def test_first_record_wins_per_asset_and_point_name(self):
+        plan = build_all_rows([
+            _record(asset_id="a1", point_name="temp", point_expression="first"),
+            _record(asset_id="a1", point_name="temp", point_expression="second"),
+        ], {})
+
+        self.assertEqual(len(plan.asset_point_rows), 1)
+        self.assertEqual(plan.asset_point_rows[0][0], "first")
+        self.assertEqual(plan.asset_point_rows[0][-2:], ("a1", "temp"))
+
+    def test_same_point_name_on_other_assets_is_kept(self):
+        plan = build_all_rows([
+            _record(asset_id="a1", point_name="temp"),
+            _record(asset_id="a2", point_name="temp"),
+            _record(asset_id="a1", point_name="humidity"),
+        ], {})
+
+        self.assertEqual(
+            [row[-2:] for row in plan.asset_point_rows],
+            [("a1", "temp"), ("a2", "temp"), ("a1", "humidity")],
+        )
+        # One data point per name, however many assets share it
+        self.assertEqual([row[3] for row in plan.data_point_rows], ["temp", "humidity"])
+
+    def test_point_names_are_stripped_before_deduplicating(self):
+        plan = build_all_rows([
+            _record(asset_id="a1", point_name=" temp ", point_expression="first"),
+            _record(asset_id="a1", point_name="temp", point_expression="second"),
+        ], {})
+
+        self.assertEqual([row[-2:] for row in plan.asset_point_rows], [("a1", "temp")])
+        self.assertEqual(plan.asset_point_rows[0][0], "first")
+
+    def test_asset_type_points_first_wins_per_asset_type_and_point_name(self):
+        plan = build_all_rows([
+            _record(asset_id="a1", asset_type="AHU", point_name="temp", point_expression="first"),
+            _record(asset_id="a2", asset_type="AHU", point_name="temp", point_expression="second"),
+        ], {"AHU": "type-1"})
+
+        self.assertEqual(len(plan.asset_point_rows), 2)
+        self.assertEqual(len(plan.asset_type_point_rows), 1)
+        self.assertEqual(plan.asset_type_point_rows[0][0], "first")
+        self.assertEqual(plan.asset_type_point_rows[0][-2:], ("type-1", "temp"))
+
+    def test_records_without_point_name_add_no_point_rows(self):
+        plan = build_all_rows([_record(asset_id="a1", point_name="  ")], {})
+
+        self.assertEqual(plan.data_point_rows, [])
+        self.assertEqual(plan.asset_point_rows, [])
+        self.assertEqual(len(plan.asset_rows), 1)
+
+
+class ResolvePointRowsTest(unittest.TestCase):
+    def test_point_name_is_replaced_with_data_point_id(self):
+        rows = [
+            ("expr", "1", "ACTIVE", "°C", "celsius", "a1", "temp"),
+            ("expr", "2", "ACTIVE", "%", "percent", "a2", "humidity"),
+        ]
+
+        resolved = resolve_point_rows(rows, {"temp": "dp-1", "humidity": "dp-2"}, "asset")
+
+        self.assertEqual(resolved, [
+            ("expr", "1", "ACTIVE", "°C", "celsius", "a1", "dp-1"),
+            ("expr", "2", "ACTIVE", "%", "percent", "a2", "dp-2"),
+        ])
+
+    def test_rows_without_data_point_are_skipped(self):
+        rows = [
+            ("expr", "1", "ACTIVE", None, None, "a1", "temp"),
+            ("expr", "1", "ACTIVE", None, None, "a1", "missing"),
+        ]
+
+        with self.assertLogs("migrations.complete_migration", level="WARNING"):
+            resolved = resolve_point_rows(rows, {"temp": "dp-1"}, "asset")
+
+        self.assertEqual(resolved, [("expr", "1", "ACTIVE", None, None, "a1", "dp-1")])
+
+
+if __name__ == "__main__":
+    unittest.main()
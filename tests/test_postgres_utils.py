@@ -0,0 +1,101 @@
+import unittest
+from unittest import mock
+
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR
+
+from db import postgres_utils
+from db.postgres_utils import DEFER_INDEXES_MIN_FRACTION, deferred_secondary_indexes, estimated_row_count
+
+
+class _FakeCursor:
+    def __init__(self, row):
+        self.row = row
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchone(self):
+        return self.row
+
+
+class _FakeConnection:
+    def __init__(self, reltuples=0.0, transaction_status=0):
+        self.cur = _FakeCursor((reltuples,))
+        self.transaction_status = transaction_status
+
+    def cursor(self):
+        return self.cur
+
+    def get_transaction_status(self):
+        return self.transaction_status
+
+
+class EstimatedRowCountTest(unittest.TestCase):
+    def test_returns_reltuples(self):
+        self.assertEqual(estimated_row_count(_FakeConnection(reltuples=1234.0), "public.asset_point"), 1234)
+
+    def test_never_analyzed_table_counts_as_empty(self):
+        self.assertEqual(estimated_row_count(_FakeConnection(reltuples=-1.0), "public.asset_point"), 0)
+
+
+class DeferredSecondaryIndexesTest(unittest.TestCase):
+    def setUp(self):
+        drop = mock.patch.object(postgres_utils, "drop_secondary_indexes", return_value=["CREATE INDEX ix"])
+        recreate = mock.patch.object(postgres_utils, "recreate_indexes")
+        self.drop = drop.start()
+        self.recreate = recreate.start()
+        self.addCleanup(drop.stop)
+        self.addCleanup(recreate.stop)
+
+    def _load(self, table_rows, row_count, transaction_status=0):
+        conn = _FakeConnection(transaction_status=transaction_status)
+        with mock.patch.object(postgres_utils, "estimated_row_count", return_value=table_rows):
+            with deferred_secondary_indexes(conn, "public.asset_point", row_count):
+                pass
+        return conn
+
+    def test_small_load_keeps_indexes(self):
+        self._load(table_rows=100000, row_count=100)
+
+        self.drop.assert_not_called()
+        self.recreate.assert_not_called()
+
+    def test_large_load_drops_and_recreates_indexes(self):
+        conn = self._load(table_rows=100000, row_count=50000)
+
+        self.drop.assert_called_once_with(conn, "public.asset_point")
+        self.recreate.assert_called_once_with(conn, ["CREATE INDEX ix"])
+
+    def test_load_at_threshold_defers_indexes(self):
+        self._load(table_rows=100000, row_count=int(100000 * DEFER_INDEXES_MIN_FRACTION))
+
+        self.drop.assert_called_once()
+
+    def test_load_just_below_threshold_keeps_indexes(self):
+        self._load(table_rows=100000, row_count=int(100000 * DEFER_INDEXES_MIN_FRACTION) - 1)
+
+        self.drop.assert_not_called()
+
+    def test_empty_table_defers_indexes(self):
+        self._load(table_rows=0, row_count=1)
+
+        self.drop.assert_called_once()
+        self.recreate.assert_called_once()
+
+    def test_aborted_transaction_skips_recreate(self):
+        with self.assertLogs("db.postgres_utils", level="WARNING"):
+            self._load(table_rows=0, row_count=10, transaction_status=TRANSACTION_STATUS_INERROR)
+
+        self.drop.assert_called_once()
+        self.recreate.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()